@@ -0,0 +1,209 @@
+import csv
+import gzip
+from datetime import datetime, timedelta
+from io import TextIOWrapper
+from tempfile import TemporaryFile
+from typing import BinaryIO, Iterator, Literal
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import Connection, Engine, Row, text
+
+ExportFormat = Literal["csv", "csv.gz", "parquet"]
+
+EXPORT_BATCH_SIZE = 5000
+EXPORT_FORMATS: dict[ExportFormat, tuple[str, str]] = {
+    "csv": ("CSV", "text/csv"),
+    "csv.gz": ("CSV (gzip compressed)", "application/gzip"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet"),
+}
+EXPORT_TIMESTAMP = pa.timestamp("us", tz="UTC")
+EXPORT_SCHEMA = pa.schema(
+    [
+        ("volunteer_id", pa.int32()),
+        ("volunteer_name", pa.string()),
+        ("volunteer_updated_at", EXPORT_TIMESTAMP),
+        ("skill_id", pa.int32()),
+        ("skill_name", pa.string()),
+        ("skill_description", pa.string()),
+        ("skill_updated_at", EXPORT_TIMESTAMP),
+        ("volunteer_skills_last_updated_at", EXPORT_TIMESTAMP),
+        ("query_ts", EXPORT_TIMESTAMP),
+    ]
+)
+# time of export, the same for all rows (to indicate caching), so not queried per row
+QUERY_TS_FIELD = "query_ts"
+# timestamps are formatted as ISO 8601 in whole seconds in text formats (i.e. CSV)
+CSV_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S+00:00"
+# delta exports add whether each row was changed (i.e. added or updated) or deleted
+DELTA_SCHEMA = EXPORT_SCHEMA.append(pa.field("change", pa.string()))
+# rows changed in transactions still open at the previous export will have times slightly before its watermark, so
+# each delta export re-includes this overlap (re-applying changed rows is harmless)
+DELTA_OVERLAP = timedelta(seconds=30)
+
+
+def _query_columns(prefix: str = "") -> str:
+    return ", ".join(f"{prefix}{name}" for name in EXPORT_SCHEMA.names if name != QUERY_TS_FIELD)
+
+
+def iter_export_batches(conn: Connection, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[list[Row]]:
+    """
+    Yield export rows (without a query time) in fixed size batches.
+
+    Rows are read through a server side cursor so only one batch is held in memory at a time. Rows are ordered by the
+    volunteer skill primary key, so can be streamed from an index scan rather than sorted first.
+    """
+    result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+        text(f"SELECT {_query_columns()} FROM v1.volunteer_skills_export ORDER BY volunteer_id, skill_id;")
+    )
+    yield from result.partitions(batch_size)
+
+
+def iter_delta_batches(conn: Connection, since: datetime, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[list]:
+    """
+    Yield export rows (without a query time) changed or deleted since a time, in fixed size batches.
+
+    Rows are changed if their volunteer, skill or the volunteer's skills have changed. Deleted rows (from tombstones)
+    only have IDs set, and aren't included if the volunteer has since re-added the skill.
+
+    Changed rows are found from the indexed update times of each table, rather than by scanning the whole export.
+    """
+    changed = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+        text(f"""
+        WITH changed AS (
+            SELECT vs.volunteer_id, vs.skill_id
+            FROM v1.volunteer_skill_update vsu
+                   JOIN v1.volunteer_skill vs ON vs.volunteer_id = vsu.volunteer_id
+            WHERE vsu.last_updated_at > :since
+            UNION
+            SELECT vs.volunteer_id, vs.skill_id
+            FROM v1.volunteer v
+                   JOIN v1.volunteer_skill vs ON vs.volunteer_id = v.id
+            WHERE v.updated_at > :since
+            UNION
+            SELECT vs.volunteer_id, vs.skill_id
+            FROM v1.skill s
+                   JOIN v1.volunteer_skill vs ON vs.skill_id = s.id
+            WHERE s.updated_at > :since
+        )
+        SELECT {_query_columns(prefix="e.")}, 'changed' AS change
+        FROM changed c
+               JOIN v1.volunteer_skills_export e ON e.volunteer_id = c.volunteer_id AND e.skill_id = c.skill_id
+        ORDER BY e.volunteer_id, e.skill_id;
+        """),
+        {"since": since},
+    )
+    yield from changed.partitions(batch_size)
+
+    deleted = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+        text("""
+        SELECT t.volunteer_id,
+               NULL,
+               NULL,
+               t.skill_id,
+               NULL,
+               NULL,
+               NULL,
+               NULL,
+               'deleted'
+        FROM v1.volunteer_skill_tombstone t
+        WHERE t.deleted_at > :since
+          AND NOT EXISTS (
+            SELECT 1 FROM v1.volunteer_skill vs WHERE vs.volunteer_id = t.volunteer_id AND vs.skill_id = t.skill_id
+          )
+        ORDER BY t.volunteer_id, t.skill_id;
+        """),
+        {"since": since},
+    )
+    yield from deleted.partitions(batch_size)
+
+
+def _record_batches(batches: Iterator[list[Row]], schema: pa.Schema, query_ts: datetime) -> Iterator[pa.RecordBatch]:
+    """Convert batches of rows into typed record batches, adding the query time."""
+    fields = [field for field in schema if field.name != QUERY_TS_FIELD]
+    for batch in batches:
+        columns = list(zip(*batch)) if batch else [[] for _ in fields]
+        arrays = {field.name: pa.array(column, type=field.type) for field, column in zip(fields, columns, strict=True)}
+        arrays[QUERY_TS_FIELD] = pa.array([query_ts] * len(batch), type=schema.field(QUERY_TS_FIELD).type)
+        yield pa.RecordBatch.from_arrays([arrays[name] for name in schema.names], schema=schema)
+
+
+def _format_csv_column(array: pa.Array) -> list:
+    # formatted per column (in Arrow) rather than per value, truncating to whole seconds as per earlier exports
+    if pa.types.is_timestamp(array.type):
+        array = pc.strftime(pc.cast(array, pa.timestamp("s", tz="UTC"), safe=False), format=CSV_TIMESTAMP_FORMAT)
+    return array.to_pylist()
+
+
+def write_csv(batches: Iterator[pa.RecordBatch], file: BinaryIO, schema: pa.Schema = EXPORT_SCHEMA) -> None:
+    """
+    Encode export rows as CSV, batch by batch.
+
+    For compatibility with earlier exports made using pandas, the first (unnamed) column is a row index.
+    """
+    wrapper = TextIOWrapper(file, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(wrapper, lineterminator="\n")
+    writer.writerow(["", *schema.names])
+    index = 0
+    for batch in batches:
+        columns = [_format_csv_column(column) for column in batch.columns]
+        writer.writerows([index + i, *row] for i, row in enumerate(zip(*columns)))
+        index += batch.num_rows
+    # detach rather than close, so the underlying file stays open
+    wrapper.detach()
+
+
+def write_parquet(batches: Iterator[pa.RecordBatch], file: BinaryIO, schema: pa.Schema = EXPORT_SCHEMA) -> None:
+    """Encode export rows as Parquet, with a row group per batch."""
+    # only needed for this format, so not imported until used
+    import pyarrow.parquet as pq
+
+    with pq.ParquetWriter(file, schema=schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+def _write(batches: Iterator[list[Row]], fmt: ExportFormat, schema: pa.Schema, query_ts: datetime) -> BinaryIO:
+    file = TemporaryFile()
+    record_batches = _record_batches(batches=batches, schema=schema, query_ts=query_ts)
+    if fmt == "parquet":
+        write_parquet(batches=record_batches, file=file, schema=schema)
+    elif fmt == "csv.gz":
+        with gzip.GzipFile(fileobj=file, mode="wb") as gz:
+            write_csv(batches=record_batches, file=gz, schema=schema)
+    else:
+        write_csv(batches=record_batches, file=file, schema=schema)
+
+    file.seek(0)
+    return file
+
+
+def export(engine: Engine, fmt: ExportFormat, batch_size: int = EXPORT_BATCH_SIZE) -> BinaryIO:
+    """
+    Export volunteer skills to a temporary file in a given format.
+
+    The file is positioned at the start and deleted when closed. Peak memory use while writing is bounded by the batch
+    size, though callers that read the whole file (e.g. for a download button) hold it all in memory.
+    """
+    with engine.connect() as conn:
+        query_ts = conn.execute(text("SELECT now();")).scalar()
+        batches = iter_export_batches(conn=conn, batch_size=batch_size)
+        return _write(batches=batches, fmt=fmt, schema=EXPORT_SCHEMA, query_ts=query_ts)
+
+
+def export_delta(
+    engine: Engine, fmt: ExportFormat, since: datetime, batch_size: int = EXPORT_BATCH_SIZE
+) -> tuple[BinaryIO, datetime]:
+    """
+    Export volunteer skills changed or deleted since a watermark to a temporary file in a given format.
+
+    Returns the file (as per `export()`) and a new watermark to use for the next delta export. Changes and deletions
+    are read from a single snapshot, so none are missed or seen twice between them (except within `DELTA_OVERLAP`).
+    """
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            watermark = conn.execute(text("SELECT now();")).scalar()
+            batches = iter_delta_batches(conn=conn, since=since - DELTA_OVERLAP, batch_size=batch_size)
+            file = _write(batches=batches, fmt=fmt, schema=DELTA_SCHEMA, query_ts=watermark)
+    return file, watermark
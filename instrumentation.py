@@ -0,0 +1,264 @@
+import json
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from statistics import quantiles
+from threading import Lock
+from time import perf_counter
+from typing import Iterator, Self
+from weakref import WeakKeyDictionary, WeakSet
+
+from psycopg2 import Error as Psycopg2Error
+from psycopg2.extensions import TRANSACTION_STATUS_INTRANS
+from sqlalchemy import Engine, event
+
+SLOW_QUERY_THRESHOLD = timedelta(milliseconds=500)
+MAX_EVENTS = 1000
+EXPLAINABLE = {"SELECT", "WITH", "INSERT", "UPDATE", "DELETE"}
+
+logger = logging.getLogger("instrumentation")
+
+# name of the query being measured and, if it wasn't served from a cache, the bytes fetched, per thread
+_query_name: ContextVar[str | None] = ContextVar("query_name", default=None)
+_bytes_fetched: ContextVar[int | None] = ContextVar("bytes_fetched", default=None)
+
+
+@dataclass(frozen=True)
+class QueryEvent:
+    """A named query made by the app, which may have been served from a cache."""
+
+    name: str
+    started_at: datetime
+    seconds: float
+    rows: int
+    bytes: int
+    cache_hit: bool
+
+
+@dataclass(frozen=True)
+class StatementEvent:
+    """A statement executed against the database, with a query plan if slow."""
+
+    name: str
+    started_at: datetime
+    seconds: float
+    rows: int
+    statement: str
+    plan: str | None = None
+
+
+@dataclass
+class QueryMeasurement:
+    """Result size of a query being measured, set by the caller."""
+
+    rows: int = 0
+
+
+@dataclass
+class _Summary:
+    calls: int = 0
+    cache_hits: int = 0
+    rows: int = 0
+    bytes: int = 0
+    seconds: list[float] = field(default_factory=list)
+
+
+def mark_cache_miss(bytes_fetched: int = 0) -> None:
+    """Record that the query being measured was executed, rather than served from a cache."""
+    _bytes_fetched.set((_bytes_fetched.get() or 0) + bytes_fetched)
+
+
+class QueryMetrics:
+    """
+    Recent query and statement timings.
+
+    Queries are recorded by wrapping calls with `measure()`. Statements are recorded for engines passed to
+    `instrument()`, using SQLAlchemy engine events, and attributed to the query being measured (if any). Statements
+    slower than `slow_query_threshold` are explained (without being run again) so their plans can be checked.
+
+    Events are also logged (as JSON) to the 'instrumentation' logger. Only the most recent `max_events` of each type
+    are kept in memory.
+
+    Instances are intended to be shared between Streamlit sessions (threads) and are guarded by a lock.
+    """
+
+    def __init__(
+        self: Self, slow_query_threshold: timedelta = SLOW_QUERY_THRESHOLD, max_events: int = MAX_EVENTS
+    ) -> None:
+        self._lock = Lock()
+        self._slow_query_threshold = slow_query_threshold.total_seconds()
+        self._queries: deque[QueryEvent] = deque(maxlen=max_events)
+        self._statements: deque[StatementEvent] = deque(maxlen=max_events)
+        self._engines: WeakSet[Engine] = WeakSet()
+
+    @property
+    def queries(self: Self) -> list[QueryEvent]:
+        """Recent queries, oldest first."""
+        with self._lock:
+            return list(self._queries)
+
+    @property
+    def statements(self: Self) -> list[StatementEvent]:
+        """Recent statements, oldest first."""
+        with self._lock:
+            return list(self._statements)
+
+    @property
+    def slow_statements(self: Self) -> list[StatementEvent]:
+        """Recent statements slower than the slow query threshold, slowest first."""
+        slow = [s for s in self.statements if s.seconds >= self._slow_query_threshold]
+        return sorted(slow, key=lambda s: s.seconds, reverse=True)
+
+    def summary(self: Self) -> list[dict]:
+        """Recent queries aggregated by name, slowest (by p95) first."""
+        summaries: dict[str, _Summary] = {}
+        for query in self.queries:
+            summary = summaries.setdefault(query.name, _Summary())
+            summary.calls += 1
+            summary.cache_hits += query.cache_hit
+            summary.rows += query.rows
+            summary.bytes += query.bytes
+            summary.seconds.append(query.seconds)
+
+        rows = []
+        for name, summary in summaries.items():
+            cuts = quantiles(summary.seconds, n=100, method="inclusive") if len(summary.seconds) > 1 else None
+            rows.append(
+                {
+                    "name": name,
+                    "calls": summary.calls,
+                    "cache_hit_ratio": summary.cache_hits / summary.calls,
+                    "p50_ms": (cuts[49] if cuts else summary.seconds[0]) * 1000,
+                    "p95_ms": (cuts[94] if cuts else summary.seconds[0]) * 1000,
+                    "max_ms": max(summary.seconds) * 1000,
+                    "rows": summary.rows,
+                    "bytes_fetched": summary.bytes,
+                }
+            )
+        return sorted(rows, key=lambda row: row["p95_ms"], reverse=True)
+
+    def to_json(self: Self) -> str:
+        """Summary and recent events as a JSON document, e.g. for download."""
+        return json.dumps(
+            {
+                "summary": self.summary(),
+                "queries": [asdict(query) for query in self.queries],
+                "statements": [asdict(statement) for statement in self.statements],
+            },
+            default=str,
+            indent=2,
+        )
+
+    def clear(self: Self) -> None:
+        with self._lock:
+            self._queries.clear()
+            self._statements.clear()
+
+    @contextmanager
+    def measure(self: Self, name: str) -> Iterator[QueryMeasurement]:
+        """
+        Time a named query.
+
+        Queries are assumed to be served from a cache unless `mark_cache_miss()` is called while measuring. The
+        caller should set the number of rows on the yielded measurement.
+        """
+        measurement = QueryMeasurement()
+        name_token = _query_name.set(name)
+        bytes_token = _bytes_fetched.set(None)
+        started_at = datetime.now(tz=timezone.utc)
+        start = perf_counter()
+        try:
+            yield measurement
+        finally:
+            seconds = perf_counter() - start
+            bytes_fetched = _bytes_fetched.get()
+            query = QueryEvent(
+                name=name,
+                started_at=started_at,
+                seconds=seconds,
+                rows=measurement.rows,
+                bytes=bytes_fetched or 0,
+                cache_hit=bytes_fetched is None,
+            )
+            _query_name.reset(name_token)
+            _bytes_fetched.reset(bytes_token)
+            self._record(query, self._queries)
+
+    def instrument(self: Self, engine: Engine) -> None:
+        """Record statements executed by an engine. Does nothing if already instrumented."""
+        with self._lock:
+            if engine in self._engines:
+                return
+            self._engines.add(engine)
+
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _record(self: Self, item: QueryEvent | StatementEvent, events: deque) -> None:
+        with self._lock:
+            events.append(item)
+        logger.info(json.dumps({"event": type(item).__name__, **asdict(item)}, default=str))
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        # keyed by execution context, rather than a stack per connection, so a statement that fails (and so never
+        # reaches `_after_cursor_execute`) can't leave a start time that later statements on the connection pick up
+        if context is None:
+            return
+        starts = conn.info.setdefault("statement_start", WeakKeyDictionary())
+        starts[context] = (datetime.now(tz=timezone.utc), perf_counter())
+
+    def _after_cursor_execute(self: Self, conn, cursor, statement, parameters, context, executemany) -> None:
+        start = conn.info.get("statement_start", {}).pop(context, None) if context is not None else None
+        if start is None:
+            # engine was instrumented while this statement was executing
+            return
+        started_at, start = start
+        seconds = perf_counter() - start
+
+        plan = None
+        if seconds >= self._slow_query_threshold and not executemany and conn.dialect.name == "postgresql":
+            plan = self._explain(cursor=cursor, statement=statement, parameters=parameters)
+
+        name = _query_name.get() or " ".join(statement.split())[:60]
+        self._record(
+            StatementEvent(
+                name=name,
+                started_at=started_at,
+                seconds=seconds,
+                rows=cursor.rowcount,
+                statement=statement,
+                plan=plan,
+            ),
+            self._statements,
+        )
+
+    @staticmethod
+    def _explain(cursor, statement: str, parameters: object) -> str | None:
+        """
+        Query plan for a statement, without running it again.
+
+        Uses a separate DBAPI cursor on the same connection, so runs in the same transaction without triggering engine
+        events. Within a transaction, a savepoint ensures a failure here can't abort the caller's transaction.
+        """
+        if statement.lstrip().split(maxsplit=1)[0].upper() not in EXPLAINABLE:
+            return None
+
+        in_transaction = cursor.connection.info.transaction_status == TRANSACTION_STATUS_INTRANS
+        with cursor.connection.cursor() as explain_cursor:
+            try:
+                if in_transaction:
+                    explain_cursor.execute("SAVEPOINT explain_slow_statement;")
+                explain_cursor.execute(f"EXPLAIN {statement}", parameters)
+                plan = "\n".join(row[0] for row in explain_cursor.fetchall())
+                if in_transaction:
+                    explain_cursor.execute("RELEASE SAVEPOINT explain_slow_statement;")
+                return plan
+            except Psycopg2Error:
+                logger.warning("Could not explain slow statement", exc_info=True)
+                if in_transaction:
+                    explain_cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_statement;")
+                return None
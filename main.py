@@ -1,11 +1,15 @@
 import streamlit as st
 
-from shared import app_version
+from shared import app_version, db_connection, diagnostics_settings, warm_up
 
 find_page = st.Page("page_find.py", title="Find volunteers with skills", icon=":material/manage_search:")
 stats_page = st.Page("page_stats.py", title="Volunteer skills statistics", icon=":material/insights:")
 update_page = st.Page("page_update.py", title="Update volunteer skills", icon=":material/edit:")
-app = st.navigation([find_page, stats_page, update_page])
+pages = [find_page, stats_page, update_page]
+# only shown if enabled in secrets
+if diagnostics_settings().get("enabled", False):
+    pages.append(st.Page("page_diagnostics.py", title="Diagnostics", icon=":material/monitor_heart:"))
+app = st.navigation(pages)
 
 st.set_page_config(page_title="MapAction Skills", page_icon=":material/point_scan:")
 with st.sidebar:
@@ -14,7 +18,9 @@ with st.sidebar:
         #### Experiment info
         - App version: {app_version()}
         - repo: [felnne/mapaction-skills-exp](https://github.com/felnne/mapaction-skills-exp)
-        - data queries are cached for 10 minutes
+        - data queries are cached until data changes (checked every 30 seconds)
         """
     )
+# before the first page renders, so shared data is cached and connections are open
+warm_up(db_connection())
 app.run()
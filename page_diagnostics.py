@@ -0,0 +1,41 @@
+import streamlit as st
+
+from shared import query_metrics, show_intro
+
+
+def show_query_summary() -> None:
+    st.header("Query diagnostics", divider=True)
+    st.info("Timings are for recent queries made by this app instance, across all sessions.")
+    metrics = query_metrics()
+
+    st.subheader("Queries")
+    st.dataframe(
+        metrics.summary(),
+        column_config={
+            "cache_hit_ratio": st.column_config.ProgressColumn(min_value=0, max_value=1),
+            "p50_ms": st.column_config.NumberColumn(format="%.1f"),
+            "p95_ms": st.column_config.NumberColumn(format="%.1f"),
+            "max_ms": st.column_config.NumberColumn(format="%.1f"),
+        },
+        hide_index=True,
+    )
+
+    st.subheader("Slow statements")
+    slow_statements = metrics.slow_statements
+    if not slow_statements:
+        st.success("No slow statements recorded.")
+    for statement in slow_statements[:20]:
+        with st.expander(f"{statement.name} ({statement.seconds * 1000:.0f} ms, {statement.started_at:%H:%M:%S})"):
+            st.code(statement.statement, language="sql")
+            if statement.plan:
+                st.code(statement.plan, language="text")
+
+    col1, col2 = st.columns(2)
+    col1.download_button("Download metrics (JSON)", metrics.to_json(), "query_metrics.json", "application/json")
+    if col2.button("Clear metrics"):
+        metrics.clear()
+        st.rerun()
+
+
+show_intro()
+show_query_summary()
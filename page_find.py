@@ -1,38 +1,134 @@
 import streamlit as st
 from streamlit.connections import SQLConnection
-from streamlit_condition_tree import condition_tree
 
-from shared import show_intro, VolunteerSkillsClient
+from data_export import EXPORT_FORMATS
+from shared import db_connection, query_metrics, show_intro, skill_index, VolunteerSkillsClient
+from skill_query import SKILL_FIELD, SkillQueryError, describe, parse_json_logic
+
+RANKED_VOLUNTEERS_LIMIT = 10
+
+
+def show_ranked_volunteers(data: VolunteerSkillsClient, skills: list[str], weighted: bool) -> None:
+    weights = None
+    if weighted:
+        edited = st.data_editor(
+            [{"skill": skill, "weight": 1.0} for skill in skills],
+            column_config={
+                "skill": st.column_config.TextColumn(disabled=True),
+                "weight": st.column_config.NumberColumn(min_value=0.0, step=0.5, help="How important this skill is"),
+            },
+            hide_index=True,
+            key="skills_query_weights",
+        )
+        weights = {row["skill"]: row["weight"] or 0.0 for row in edited}
+
+    ranked_volunteers = data.rank_volunteers_by_skills(set(skills), weights=weights, limit=RANKED_VOLUNTEERS_LIMIT)
+    if len(ranked_volunteers) == 0:
+        st.warning("No volunteers found with any of the selected skills.")
+        return
+    st.dataframe(
+        [
+            {
+                "volunteer": volunteer.name,
+                "score": volunteer.score,
+                "matched": ", ".join(volunteer.matched),
+                "missing": ", ".join(volunteer.missing),
+            }
+            for volunteer in ranked_volunteers
+        ],
+        hide_index=True,
+    )
 
 
 def show_skills_query(data: VolunteerSkillsClient) -> None:
     st.header("Find a volunteer by their skills", divider=True)
     selected_skills = st.multiselect("Choose skills", data.available_skills)
-    if len(selected_skills) > 0:
-        filtered_volunteers = data.filter_volunteers_by_skills(set(selected_skills))
+    ranked = st.toggle(
+        "Rank closest matches", help="Include volunteers with some of the selected skills, with optional weights"
+    )
+    if len(selected_skills) == 0:
+        return
+    if ranked:
+        show_ranked_volunteers(data=data, skills=selected_skills, weighted=True)
+        return
+
+    filtered_volunteers = data.filter_volunteers_by_skills(set(selected_skills))
+    if len(filtered_volunteers) > 0:
+        st.markdown("\n".join(f"- {volunteer}" for volunteer in filtered_volunteers))
+    else:
+        st.warning("No volunteers found with all the selected skills. Closest matches:")
+        show_ranked_volunteers(data=data, skills=selected_skills, weighted=False)
+
+
+def show_skill_categories_query(data: VolunteerSkillsClient) -> None:
+    st.header("Find a volunteer by skill category", divider=True)
+    selected_categories = st.multiselect("Choose skill categories", data.skill_categories)
+    if len(selected_categories) > 0:
+        filtered_volunteers = data.filter_volunteers_by_categories(set(selected_categories))
         if len(filtered_volunteers) > 0:
             st.markdown("\n".join(f"- {volunteer}" for volunteer in filtered_volunteers))
         else:
-            st.warning("No volunteers found with all the selected skills.")
+            st.warning("No volunteers found with any skills in the selected categories.")
 
 
-def show_skills_query_advanced() -> None:
+def show_skills_query_advanced(data: VolunteerSkillsClient) -> None:
     st.header("Find a volunteer by their skills (Advanced mode)", divider=True)
-    st.info("Example of how more advanced queries could be built. The UI would need work to make usable.")
+    st.info("Combine skills using AND, OR and NOT groups. The UI would need work to make more usable.")
+    if not st.toggle("Use advanced mode", key="skills_query_advanced_enabled"):
+        return
+    # component is only loaded when needed, as it's relatively slow to import
+    from streamlit_condition_tree import condition_tree
+
+    config = {
+        "fields": {
+            SKILL_FIELD: {
+                "label": "skill",
+                "type": "select",
+                "valueSources": ["value"],
+                "operators": ["select_equals", "select_not_equals", "select_any_in", "select_not_any_in"],
+                "fieldSettings": {"listValues": [{"value": s, "title": s} for s in data.available_skills]},
+            }
+        }
+    }
+    logic = condition_tree(config=config, return_type="jsonLogic", key="skills_query_advanced")
+
+    try:
+        plan = parse_json_logic(logic)
+    except SkillQueryError as e:
+        st.error(f"Query not supported: {e}")
+        return
+    if plan is None:
+        return
 
-    query = condition_tree(config={"fields": {"skill": {"label": "skill", "type": "text"}}}, return_type="sql")
-    st.code(query)
+    st.markdown(f"Volunteers with: **{describe(plan)}**")
+    filtered_volunteers = data.query_volunteers(plan)
+    if len(filtered_volunteers) > 0:
+        st.markdown("\n".join(f"- {volunteer}" for volunteer in filtered_volunteers))
+    else:
+        st.warning("No volunteers found matching this query.")
 
 
 def show_data_export(data: VolunteerSkillsClient) -> None:
     st.header("Export data", divider=True)
-    st.download_button("Download data as CSV for analysis.", data.export.to_csv(), "volunteer_skills.csv", "text/csv")
+    fmt = st.radio(
+        "Format", EXPORT_FORMATS.keys(), format_func=lambda f: EXPORT_FORMATS[f][0], horizontal=True, key="export_fmt"
+    )
+    # exports are only generated when requested, rather than on every page load, and kept for the session so the
+    # download button survives reruns (the download button needs the whole export in memory regardless)
+    if st.button("Prepare data for analysis"):
+        with st.spinner("Exporting data..."), data.export(fmt=fmt) as file:
+            st.session_state.export = (fmt, file.read())
+    export = st.session_state.get("export")
+    if export is not None and export[0] == fmt:
+        st.download_button(
+            f"Download data as {EXPORT_FORMATS[fmt][0]}", export[1], f"volunteer_skills.{fmt}", EXPORT_FORMATS[fmt][1]
+        )
     expand = st.expander("Data schema", icon=":material/info:")
     expand.markdown("""
     ### V1 schema
 
     #### Columns
-    1. (index, no header row text)
+    1. (index, no header row text, CSV only)
     1. `volunteer_id`
     1. `volunteer_name` (given + family)
     1. `volunteer_updated_at` (ISO 8601)
@@ -46,13 +142,15 @@ def show_data_export(data: VolunteerSkillsClient) -> None:
     #### Notes
     - `volunteer_id`, `skill_id` values are unique to this application
     - ordered by `volunteer_id`, `skill_id`
+    - timestamps are ISO 8601 (UTC, whole seconds) in CSV and UTC timestamps in Parquet
     """)
 
 
-conn: SQLConnection = st.connection("neon", type="sql")
-engine = VolunteerSkillsClient(conn=conn)
+conn: SQLConnection = db_connection()
+engine = VolunteerSkillsClient(conn=conn, index=skill_index(), metrics=query_metrics())
 
 show_intro()
 show_skills_query(data=engine)
-show_skills_query_advanced()
+show_skill_categories_query(data=engine)
+show_skills_query_advanced(data=engine)
 show_data_export(data=engine)
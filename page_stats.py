@@ -1,26 +1,80 @@
 import streamlit as st
 from streamlit.connections import SQLConnection
 
-from shared import show_intro, VolunteerSkillsClient
+from shared import db_connection, query_metrics, show_intro, skill_index, VolunteerSkillsClient
+
+SKILL_ASSOCIATIONS_LIMIT = 20
 
 
 def show_skills_stats(data: VolunteerSkillsClient) -> None:
     st.header("Volunteer skills statistics", divider=True)
+    stats = data.stats_snapshot
 
     col1, col2, col3 = st.columns(3)
-    col1.metric("Volunteers", data.count_volunteers)
-    col2.metric("Skills (Possible)", data.count_skills_possible)
-    col3.metric("Skills (Available)", data.count_skills_available)
+    col1.metric("Volunteers", stats.count_volunteers)
+    col2.metric("Skills (Possible)", stats.count_skills_possible)
+    col3.metric("Skills (Available)", stats.count_skills_available)
 
     st.info("These metrics and charts were me messing around with streamlit, I don't think they're very useful.")
 
-    tab1, tab2 = st.tabs(["Volunteer skills", "Skill count"])
-    tab1.bar_chart(data.chart_volunteers_skills, horizontal=True)
-    tab2.bar_chart(data.chart_skills, horizontal=True)
+    tab1, tab2, tab3, tab4 = st.tabs(["Volunteer skills", "Skill count", "Skill categories", "Skills held together"])
+    tab1.bar_chart(stats.chart_volunteers_skills, horizontal=True)
+    tab2.bar_chart(stats.chart_skills, horizontal=True)
+    tab3.dataframe(
+        [
+            {
+                "category": category,
+                "volunteers": values["volunteers"],
+                "skills": values["skills"],
+                "coverage": values["skills_available"] / values["skills"],
+            }
+            for category, values in sorted(stats.category_stats.items())
+        ],
+        column_config={
+            "volunteers": st.column_config.NumberColumn(help="Volunteers with any skill in this category"),
+            "coverage": st.column_config.ProgressColumn(
+                help="Proportion of skills in this category at least one volunteer has", min_value=0, max_value=1
+            ),
+        },
+        hide_index=True,
+    )
+    show_skill_associations(data=data, container=tab4)
+
+
+def show_skill_associations(data: VolunteerSkillsClient, container) -> None:
+    skills = data.possible_skills
+    associations = data.skill_associations(limit=SKILL_ASSOCIATIONS_LIMIT)
+    if not associations:
+        container.info("Not enough volunteers share skills yet.")
+        return
+    container.dataframe(
+        [
+            {
+                "volunteers_with": skills.get(str(association.skill_id), association.skill_id),
+                "usually_also_have": skills.get(str(association.other_skill_id), association.other_skill_id),
+                "volunteers": association.volunteers,
+                "confidence": association.confidence,
+                "lift": association.lift,
+            }
+            for association in associations
+        ],
+        column_config={
+            "volunteers_with": "Volunteers with",
+            "usually_also_have": "Usually also have",
+            "volunteers": st.column_config.NumberColumn(help="Volunteers with both skills"),
+            "confidence": st.column_config.ProgressColumn(
+                help="Proportion of volunteers with the first skill who also have the second", min_value=0, max_value=1
+            ),
+            "lift": st.column_config.NumberColumn(
+                help="How many times more likely volunteers with the first skill are to have the second", format="%.1fx"
+            ),
+        },
+        hide_index=True,
+    )
 
 
-conn: SQLConnection = st.connection("neon", type="sql")
-engine = VolunteerSkillsClient(conn=conn)
+conn: SQLConnection = db_connection()
+engine = VolunteerSkillsClient(conn=conn, index=skill_index(), metrics=query_metrics())
 
 show_intro()
 show_skills_stats(data=engine)
@@ -1,10 +1,24 @@
-from itertools import islice
+from concurrent.futures import Future
+from datetime import timedelta
+from math import ceil
 
 import streamlit as st
 from pandas import Timestamp
 from streamlit.connections import SQLConnection
 
-from shared import show_intro, VolunteerSkillsClient
+from shared import (
+    db_connection,
+    query_metrics,
+    show_intro,
+    skill_index,
+    SkillSaveConflictError,
+    VolunteerContext,
+    VolunteerSkillsClient,
+)
+
+SKILLS_PAGE_SIZE = 30
+SKILL_SUGGESTIONS_LIMIT = 5
+SAVE_POLL_INTERVAL = timedelta(seconds=1)
 
 
 def _format_datetime(ts: Timestamp) -> str:
@@ -13,60 +27,173 @@ def _format_datetime(ts: Timestamp) -> str:
 
 def show_volunteer_select(data: VolunteerSkillsClient) -> None:
     st.subheader("What is your name?")
-    options = {0: "I am...", **data.volunteers}
-    volunteer_name = st.selectbox("volunteer", options.values(), label_visibility="hidden")
+    # only the closest matches for a name are loaded, rather than all volunteers
+    fragment = st.text_input("Search", placeholder="Start typing your name...", key="volunteer_search")
+    volunteers = data.search_volunteers(fragment=fragment)
+    if fragment and not volunteers:
+        st.warning("No volunteers found with this name.")
+    st.selectbox(
+        "volunteer",
+        [None, *volunteers],
+        format_func=lambda volunteer_id: "I am..." if volunteer_id is None else volunteers[volunteer_id],
+        key="volunteer_id",
+        label_visibility="hidden",
+    )
+
+
+def _volunteer_context(data: VolunteerSkillsClient, volunteer_id: str) -> VolunteerContext:
+    # kept for the session across reruns (e.g. each checkbox click) until the volunteer changes or skills are saved
+    context: VolunteerContext | None = st.session_state.get("volunteer_context")
+    if context is None or context.volunteer_id != volunteer_id:
+        context = data.volunteer_context(volunteer_id=volunteer_id)
+        st.session_state.volunteer_context = context
+        # selected skills are tracked as a set as only the current page of skills is rendered as checkboxes
+        st.session_state.selected_skill_ids = set(context.selected_skill_ids)
+        # checkbox states are re-seeded from the reloaded skills when next rendered
+        for key in [key for key in st.session_state if str(key).startswith("skill_")]:
+            del st.session_state[key]
+    return context
+
+
+def _group_skills(context: VolunteerContext) -> dict[str, dict[str, str]]:
+    grouped: dict[str, dict[str, str]] = {}
+    for skill_id, skill_name in context.skills.items():
+        grouped.setdefault(context.skill_categories[skill_id], {})[skill_id] = skill_name
+    return dict(sorted(grouped.items()))
+
+
+def _toggle_skill(skill_id: str, key: str) -> None:
+    selected_skill_ids: set[str] = st.session_state.selected_skill_ids
+    if st.session_state[key]:
+        selected_skill_ids.add(skill_id)
+    else:
+        selected_skill_ids.discard(skill_id)
+
+
+def _add_skill(skill_id: str, key: str) -> None:
+    st.session_state.selected_skill_ids.add(skill_id)
+    st.session_state[key] = True
+
+
+def show_skill_suggestions(data: VolunteerSkillsClient, context: VolunteerContext) -> None:
+    selected_skill_ids: set[str] = st.session_state.selected_skill_ids
+    suggestions = [
+        suggestion
+        for suggestion in data.suggest_skills(skill_ids=selected_skill_ids, limit=SKILL_SUGGESTIONS_LIMIT)
+        if str(suggestion.other_skill_id) in context.skills
+    ]
+    if not suggestions:
+        return
 
-    st.session_state.volunteer_id = None
+    st.markdown("**You might also have:**")
+    for suggestion in suggestions:
+        skill_id = str(suggestion.other_skill_id)
+        col1, col2 = st.columns([1, 3], vertical_alignment="center")
+        col1.button(
+            context.skills[skill_id],
+            icon=":material/add:",
+            key=f"suggest_{skill_id}_v_{context.volunteer_id}",
+            on_click=_add_skill,
+            kwargs={"skill_id": skill_id, "key": f"skill_{skill_id}_v_{context.volunteer_id}"},
+        )
+        col2.caption(
+            f"{suggestion.confidence:.0%} of volunteers with {context.skills.get(str(suggestion.skill_id), 'a skill')} "
+            f"also have this skill"
+        )
+
+
+@st.fragment(run_every=SAVE_POLL_INTERVAL)
+def _wait_for_save(save: Future) -> None:
+    # only this fragment reruns while waiting, the whole page reruns once the save has finished to show the outcome
+    if save.done():
+        st.rerun()
+    st.info("Saving your skills...", icon=":material/sync:")
+
+
+def show_save_status() -> None:
+    save: Future | None = st.session_state.get("pending_save")
+    if save is None:
+        return
+    if not save.done():
+        _wait_for_save(save)
+        return
+
+    del st.session_state.pending_save
     try:
-        st.session_state.volunteer_id = next(k for k, v in data.volunteers.items() if v == volunteer_name)
-    except StopIteration:
-        pass
+        save.result()
+    except SkillSaveConflictError:
+        st.warning(
+            "Your skills were changed elsewhere (e.g. in another tab) since this page loaded them, so haven't been "
+            "saved. Your latest skills are shown below, please check them and save again."
+        )
+    except Exception:
+        st.error("Your skills couldn't be saved, please try again.")
+        return
+    else:
+        st.success("Skills updated")
+    # reloaded with the latest skills and last updated time, for the next save
+    st.session_state.pop("volunteer_context", None)
 
 
 def show_skills(data: VolunteerSkillsClient) -> None:
     volunteer_id = st.session_state.volunteer_id
-    skills_total_quarter = data.count_skills_possible // 3
-    possible_skills = data.possible_skills
-    prev_selected_skills = data.filter_skills_by_volunteer(volunteer_id=volunteer_id)
-    volunteer_version = data.volunteer_skills_last_updated(volunteer_id=volunteer_id)
-    new_updated_skills = data.filter_skills_updated_after(date=volunteer_version)
+    context = _volunteer_context(data=data, volunteer_id=volunteer_id)
+    selected_skill_ids: set[str] = st.session_state.selected_skill_ids
+    grouped_skills = _group_skills(context)
 
     st.subheader("What skills do you have?")
     st.info(
-        f"**{len(new_updated_skills)} skills** (indicated by ✨) have been added or updated since you last "
+        f"**{len(context.new_skill_ids)} skills** (indicated by ✨) have been added or updated since you last "
         f"updated your skills."
     )
 
-    col1, col2, col3 = st.columns(3)
-    cols = [
-        (col1, dict(islice(possible_skills.items(), skills_total_quarter))),
-        (col2, dict(islice(possible_skills.items(), skills_total_quarter, 2 * skills_total_quarter))),
-        (col3, dict(islice(possible_skills.items(), 2 * skills_total_quarter, None))),
-    ]
-    for col, skills in cols:
-        with col:
-            for skill_id, skill_name in skills.items():
-                label = f"**{skill_name} ✨**" if skill_id in new_updated_skills else skill_name
-                st.checkbox(
-                    label=label, key=f"skill_{skill_id}_v_{volunteer_id}", value=skill_id in prev_selected_skills
-                )
-
-    save_changes = st.button("Save changes")
-    if save_changes:
-        new_selected_skill_ids = [
-            key.replace("skill_", "").replace(f"_v_{volunteer_id}", "")
-            for key in st.session_state
-            if key.startswith("skill_") and f"v_{volunteer_id}" in key and st.session_state[key]
-        ]
-        data.set_volunteer_skills(volunteer_id=volunteer_id, skill_ids=new_selected_skill_ids)
-        st.success("Skills updated")
+    category = st.radio(
+        "Category",
+        grouped_skills,
+        format_func=lambda c: f"{c} ({len(grouped_skills[c].keys() & selected_skill_ids)})",
+        horizontal=True,
+        key=f"skills_category_v_{volunteer_id}",
+    )
+    skills = list(grouped_skills.get(category, {}).items())
+    pages = max(ceil(len(skills) / SKILLS_PAGE_SIZE), 1)
+    page = 1
+    if pages > 1:
+        page = st.radio("Page", range(1, pages + 1), horizontal=True, key=f"skills_page_{category}_v_{volunteer_id}")
+    skills = skills[(page - 1) * SKILLS_PAGE_SIZE : page * SKILLS_PAGE_SIZE]
+
+    cols = st.columns(3)
+    skills_per_col = max(ceil(len(skills) / len(cols)), 1)
+    for i, (skill_id, skill_name) in enumerate(skills):
+        key = f"skill_{skill_id}_v_{volunteer_id}"
+        label = f"**{skill_name} ✨**" if skill_id in context.new_skill_ids else skill_name
+        # checkbox values are set through session state only (seeded before first rendered), as suggestions set them
+        if key not in st.session_state:
+            st.session_state[key] = skill_id in selected_skill_ids
+        cols[i // skills_per_col].checkbox(
+            label=label,
+            key=key,
+            on_change=_toggle_skill,
+            kwargs={"skill_id": skill_id, "key": key},
+        )
+
+    show_skill_suggestions(data=data, context=context)
+
+    # saved in the background so the page stays responsive, and rejected if saved elsewhere since loaded
+    pending = "pending_save" in st.session_state
+    save_changes = st.button("Save changes", disabled=pending)
+    if save_changes and not pending:
+        st.session_state.pending_save = data.save_volunteer_skills(
+            volunteer_id=volunteer_id, skill_ids=sorted(selected_skill_ids), context=context
+        )
+        st.rerun()
 
 
-conn: SQLConnection = st.connection("neon", type="sql")
-engine = VolunteerSkillsClient(conn=conn)
+conn: SQLConnection = db_connection()
+engine = VolunteerSkillsClient(conn=conn, index=skill_index(), metrics=query_metrics())
 
 show_intro()
 st.header("Update your skills", divider=True)
 show_volunteer_select(data=engine)
+show_save_status()
 if st.session_state.volunteer_id:
     show_skills(data=engine)
@@ -0,0 +1,5 @@
+DROP TRIGGER IF EXISTS v1_volunteer_skills_deleted_tombstone ON v1.volunteer_skill;
+
+DROP FUNCTION IF EXISTS volunteer_skill_tombstones();
+
+DROP TABLE IF EXISTS v1.volunteer_skill_tombstone;
@@ -0,0 +1,8 @@
+DROP INDEX IF EXISTS v1.volunteer_skill_skill_id_idx;
+
+DROP INDEX IF EXISTS v1.skill_category_id_idx;
+
+ALTER TABLE v1.skill
+  DROP COLUMN IF EXISTS category_id;
+
+DROP TABLE IF EXISTS v1.skill_category;
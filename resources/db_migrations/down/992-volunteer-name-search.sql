@@ -0,0 +1,3 @@
+DROP INDEX IF EXISTS v1.volunteer_name_trgm_idx;
+
+DROP EXTENSION IF EXISTS pg_trgm;
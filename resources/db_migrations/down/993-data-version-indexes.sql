@@ -0,0 +1,5 @@
+-- migrate:no-transaction
+
+DROP INDEX CONCURRENTLY IF EXISTS v1.volunteer_skill_update_last_updated_at_idx;
+DROP INDEX CONCURRENTLY IF EXISTS v1.skill_updated_at_idx;
+DROP INDEX CONCURRENTLY IF EXISTS v1.volunteer_updated_at_idx;
@@ -0,0 +1,47 @@
+DROP TRIGGER IF EXISTS v1_volunteer_skills_deleted_updated_at ON v1.volunteer_skill;
+DROP TRIGGER IF EXISTS v1_volunteer_skills_inserted_updated_at ON v1.volunteer_skill;
+
+CREATE OR REPLACE FUNCTION volunteer_skills_last_updated_at() RETURNS TRIGGER AS
+$$
+DECLARE
+  vol_id INT;
+
+BEGIN
+IF TG_OP = 'INSERT' THEN
+  vol_id := NEW.volunteer_id;
+ELSIF TG_OP = 'DELETE' THEN
+  vol_id := OLD.volunteer_id;
+END IF;
+
+INSERT INTO v1.volunteer_skill_update (volunteer_id)
+VALUES (vol_id)
+ON CONFLICT(volunteer_id)
+DO UPDATE SET
+  last_updated_at = now();
+
+IF TG_OP = 'INSERT' THEN
+  INSERT INTO v1.volunteer_skill_set (volunteer_id, skill_ids)
+  VALUES (vol_id, ARRAY[NEW.skill_id])
+  ON CONFLICT(volunteer_id)
+  DO UPDATE SET
+    skill_ids = array_append(v1.volunteer_skill_set.skill_ids, NEW.skill_id);
+
+  RETURN NEW;
+ELSIF TG_OP = 'DELETE' THEN
+  UPDATE v1.volunteer_skill_set
+  SET skill_ids = array_remove(skill_ids, OLD.skill_id)
+  WHERE volunteer_id = vol_id;
+
+  DELETE FROM v1.volunteer_skill_set
+  WHERE volunteer_id = vol_id AND cardinality(skill_ids) = 0;
+
+  RETURN OLD;
+END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER v1_volunteer_skills_updated_at
+  AFTER INSERT OR DELETE
+  ON v1.volunteer_skill
+  FOR EACH ROW
+EXECUTE FUNCTION volunteer_skills_last_updated_at();
@@ -0,0 +1,42 @@
+CREATE OR REPLACE FUNCTION volunteer_skills_last_updated_at() RETURNS TRIGGER AS
+$$
+DECLARE
+  vol_id INT;
+
+BEGIN
+IF TG_OP = 'INSERT' THEN
+  vol_id := NEW.volunteer_id;
+ELSIF TG_OP = 'DELETE' THEN
+  vol_id := OLD.volunteer_id;
+END IF;
+
+INSERT INTO v1.volunteer_skill_update (volunteer_id)
+VALUES (vol_id)
+ON CONFLICT(volunteer_id)
+DO UPDATE SET
+  last_updated_at = now();
+
+IF TG_OP = 'INSERT' THEN
+  RETURN NEW;
+ELSIF TG_OP = 'DELETE' THEN
+  RETURN OLD;
+END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER v1_volunteer_skills_updated_at
+  BEFORE INSERT OR DELETE
+  ON v1.volunteer_skill
+  FOR EACH ROW
+EXECUTE FUNCTION volunteer_skills_last_updated_at();
+
+DROP TABLE IF EXISTS v1.volunteer_skill_set;
+
+CREATE OR REPLACE VIEW v1.volunteer_skills AS
+(
+SELECT v.given_name || ' ' || v.family_name AS volunteer, array_agg(s.name) AS skills
+FROM v1.volunteer_skill vs
+       JOIN v1.volunteer v ON vs.volunteer_id = v.id
+       JOIN v1.skill s ON vs.skill_id = s.id
+GROUP BY v.id
+  );
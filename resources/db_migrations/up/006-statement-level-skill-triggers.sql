@@ -0,0 +1,58 @@
+-- replaces the row level volunteer skills trigger with statement level triggers, so each volunteer affected by a
+-- statement is updated once, rather than once per inserted or deleted row
+
+CREATE OR REPLACE FUNCTION volunteer_skills_last_updated_at() RETURNS TRIGGER AS
+$$
+DECLARE
+  vol_ids INT[];
+
+BEGIN
+IF TG_OP = 'INSERT' THEN
+  SELECT array_agg(DISTINCT volunteer_id ORDER BY volunteer_id) INTO vol_ids FROM new_rows;
+ELSIF TG_OP = 'DELETE' THEN
+  SELECT array_agg(DISTINCT volunteer_id ORDER BY volunteer_id) INTO vol_ids FROM old_rows;
+END IF;
+
+IF vol_ids IS NULL THEN
+  RETURN NULL;
+END IF;
+
+INSERT INTO v1.volunteer_skill_update (volunteer_id)
+SELECT unnest(vol_ids)
+ON CONFLICT(volunteer_id)
+DO UPDATE SET
+  last_updated_at = now();
+
+INSERT INTO v1.volunteer_skill_set (volunteer_id, skill_ids)
+SELECT volunteer_id, array_agg(skill_id ORDER BY skill_id)
+FROM v1.volunteer_skill
+WHERE volunteer_id = ANY (vol_ids)
+GROUP BY volunteer_id
+ON CONFLICT(volunteer_id)
+DO UPDATE SET
+  skill_ids = EXCLUDED.skill_ids;
+
+DELETE FROM v1.volunteer_skill_set vss
+WHERE vss.volunteer_id = ANY (vol_ids)
+  AND NOT EXISTS (SELECT 1 FROM v1.volunteer_skill vs WHERE vs.volunteer_id = vss.volunteer_id);
+
+RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS v1_volunteer_skills_updated_at ON v1.volunteer_skill;
+
+-- transition tables can't be used by triggers for more than one event, hence separate insert and delete triggers
+CREATE OR REPLACE TRIGGER v1_volunteer_skills_inserted_updated_at
+  AFTER INSERT
+  ON v1.volunteer_skill
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT
+EXECUTE FUNCTION volunteer_skills_last_updated_at();
+
+CREATE OR REPLACE TRIGGER v1_volunteer_skills_deleted_updated_at
+  AFTER DELETE
+  ON v1.volunteer_skill
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT
+EXECUTE FUNCTION volunteer_skills_last_updated_at();
@@ -0,0 +1,6 @@
+-- migrate:no-transaction
+-- indexes so the latest change times (used as a data version for caching) can be read without scanning each table
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS volunteer_updated_at_idx ON v1.volunteer (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS skill_updated_at_idx ON v1.skill (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS volunteer_skill_update_last_updated_at_idx ON v1.volunteer_skill_update (last_updated_at);
@@ -0,0 +1,7 @@
+-- trigram index on volunteer full names so they can be searched by any part (e.g. when typing a name) without
+-- scanning all volunteers
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS volunteer_name_trgm_idx
+  ON v1.volunteer USING GIN ((given_name || ' ' || family_name) gin_trgm_ops);
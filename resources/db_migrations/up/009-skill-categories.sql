@@ -0,0 +1,15 @@
+-- groups of skills (e.g. 'Creative arts'), as defined in the list of skills used to seed the database
+
+CREATE TABLE IF NOT EXISTS v1.skill_category
+(
+    id   INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+ALTER TABLE v1.skill
+  ADD COLUMN IF NOT EXISTS category_id INT REFERENCES v1.skill_category (id);
+
+CREATE INDEX IF NOT EXISTS skill_category_id_idx ON v1.skill (category_id);
+
+-- for finding volunteers by skill (the primary key covers finding skills by volunteer)
+CREATE INDEX IF NOT EXISTS volunteer_skill_skill_id_idx ON v1.volunteer_skill (skill_id);
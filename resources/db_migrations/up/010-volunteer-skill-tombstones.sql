@@ -0,0 +1,32 @@
+-- records removed volunteer skills, so incremental exports can include deletions
+
+CREATE TABLE IF NOT EXISTS v1.volunteer_skill_tombstone
+(
+    volunteer_id INT                      NOT NULL,
+    skill_id     INT                      NOT NULL,
+    deleted_at   TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (volunteer_id, skill_id)
+);
+
+CREATE INDEX IF NOT EXISTS volunteer_skill_tombstone_deleted_at_idx ON v1.volunteer_skill_tombstone (deleted_at);
+
+CREATE OR REPLACE FUNCTION volunteer_skill_tombstones() RETURNS TRIGGER AS
+$$
+BEGIN
+INSERT INTO v1.volunteer_skill_tombstone (volunteer_id, skill_id)
+SELECT volunteer_id, skill_id
+FROM old_rows
+ON CONFLICT(volunteer_id, skill_id)
+DO UPDATE SET
+  deleted_at = now();
+
+RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER v1_volunteer_skills_deleted_tombstone
+  AFTER DELETE
+  ON v1.volunteer_skill
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT
+EXECUTE FUNCTION volunteer_skill_tombstones();
@@ -0,0 +1,21 @@
+-- replaces the export view with one returning native types (formatted when exported, if needed) and without an
+-- ordering or query time, so exports can be ordered by volunteer and skill using the volunteer skill primary key and
+-- streamed without sorting or formatting every row first
+
+DROP VIEW IF EXISTS v1.volunteer_skills_export;
+
+CREATE VIEW v1.volunteer_skills_export AS
+(
+SELECT vs.volunteer_id                        AS volunteer_id,
+       v.given_name || ' ' || v.family_name   AS volunteer_name,
+       v.updated_at                           AS volunteer_updated_at,
+       vs.skill_id                            AS skill_id,
+       s.name                                 AS skill_name,
+       s.description                          AS skill_description,
+       s.updated_at                           AS skill_updated_at,
+       vsu.last_updated_at                    AS volunteer_skills_last_updated_at
+FROM v1.volunteer_skill vs
+       JOIN v1.volunteer v ON vs.volunteer_id = v.id
+       JOIN v1.volunteer_skill_update vsu ON vs.volunteer_id = vsu.volunteer_id
+       JOIN v1.skill s ON vs.skill_id = s.id
+  );
@@ -0,0 +1,368 @@
+import argparse
+import json
+import logging
+import random
+import sys
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from statistics import quantiles
+from time import perf_counter
+from typing import Callable
+
+from faker import Faker
+from sqlalchemy import Engine, event, text
+
+from db_client import DatabaseClient, make_engine
+from db_seed import (
+    _load_skill_categories,
+    _load_skills_flat,
+    insert_skill_categories,
+    insert_skills,
+    insert_volunteers_bulk,
+)
+from regressions import compare
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# the client under test is part of the app rather than these scripts
+sys.path.insert(0, str(PROJECT_ROOT))
+import streamlit as st  # noqa: E402
+from streamlit.logger import set_log_level  # noqa: E402
+
+from shared import VolunteerSkillsClient  # noqa: E402
+from skill_index import SkillIndex  # noqa: E402
+from skill_query import And, Not, Or, Skill  # noqa: E402
+
+
+@dataclass
+class Case:
+    """A client method to benchmark, with how to count the rows it returns."""
+
+    name: str
+    call: Callable[[VolunteerSkillsClient, random.Random, dict], object]
+    rows: Callable[[object, dict], int] = lambda result, fixtures: len(result) if hasattr(result, "__len__") else 1
+    write: bool = False
+    # only supported by clients with a skill index
+    index_only: bool = False
+
+
+@dataclass
+class Result:
+    size: str
+    case: str
+    mode: str
+    samples: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    rows: int
+    rows_per_sec: float
+    plans: list = field(default_factory=list)
+
+
+def _popular_skills(fixtures: dict, rng: random.Random, count: int) -> set[str]:
+    return set(rng.sample(fixtures["popular_skills"], k=count))
+
+
+def _toggle_skill(client: VolunteerSkillsClient, rng: random.Random, fixtures: dict) -> None:
+    volunteer_id = rng.choice(fixtures["volunteer_ids"])
+    skill_ids = set(client.filter_skills_by_volunteer(volunteer_id=volunteer_id))
+    skill_ids ^= {rng.choice(fixtures["skill_ids"])}
+    client.set_volunteer_skills(volunteer_id=volunteer_id, skill_ids=list(skill_ids))
+
+
+def _export(client: VolunteerSkillsClient, fmt: str) -> int:
+    with client.export(fmt=fmt) as file:
+        return len(file.read())
+
+
+CASES = [
+    Case("volunteers", lambda c, r, f: c.volunteers),
+    Case("search_volunteers", lambda c, r, f: c.search_volunteers(r.choice(f["volunteer_names"])[:4])),
+    Case("possible_skills", lambda c, r, f: c.possible_skills),
+    Case("available_skills", lambda c, r, f: c.available_skills),
+    Case("stats_snapshot", lambda c, r, f: c.stats_snapshot),
+    Case("count_volunteers", lambda c, r, f: c.count_volunteers),
+    Case("count_skills_possible", lambda c, r, f: c.count_skills_possible),
+    Case("count_skills_available", lambda c, r, f: c.count_skills_available),
+    Case("chart_volunteers_skills", lambda c, r, f: c.chart_volunteers_skills),
+    Case("chart_skills", lambda c, r, f: c.chart_skills),
+    Case("filter_skills_by_volunteer", lambda c, r, f: c.filter_skills_by_volunteer(r.choice(f["volunteer_ids"]))),
+    Case("volunteer_context", lambda c, r, f: c.volunteer_context(r.choice(f["volunteer_ids"]))),
+    Case("filter_skills_updated_after", lambda c, r, f: c.filter_skills_updated_after(f["updated_after"])),
+    Case(
+        "volunteer_skills_last_updated", lambda c, r, f: c.volunteer_skills_last_updated(r.choice(f["volunteer_ids"]))
+    ),
+    Case("rank_volunteers_by_skills", lambda c, r, f: c.rank_volunteers_by_skills(_popular_skills(f, r, 5))),
+    Case("filter_volunteers_by_categories", lambda c, r, f: c.filter_volunteers_by_categories({"Creative arts"})),
+    Case("filter_volunteers_by_skills", lambda c, r, f: c.filter_volunteers_by_skills(_popular_skills(f, r, 2))),
+    Case(
+        "query_volunteers",
+        lambda c, r, f: c.query_volunteers(
+            And(
+                terms=(
+                    Skill(name=f["popular_skills"][0]),
+                    Or(terms=tuple(Skill(name=s) for s in _popular_skills(f, r, 2))),
+                    Not(term=Skill(name=f["popular_skills"][-1])),
+                )
+            )
+        ),
+    ),
+    Case("skill_associations", lambda c, r, f: c.skill_associations(), index_only=True),
+    Case(
+        "suggest_skills",
+        lambda c, r, f: c.suggest_skills(set(r.sample(f["skill_ids"], k=3))),
+        index_only=True,
+    ),
+    Case("export_csv", lambda c, r, f: _export(c, "csv"), rows=lambda _, f: f["volunteer_skills"]),
+    Case("export_parquet", lambda c, r, f: _export(c, "parquet"), rows=lambda _, f: f["volunteer_skills"]),
+    Case("set_volunteer_skills", _toggle_skill, rows=lambda _, f: 1, write=True),
+]
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float, float]:
+    if len(samples) == 1:
+        return samples[0], samples[0], samples[0]
+    cuts = quantiles(samples, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+def _expand_skills(skills: list[str], target: int) -> list[str]:
+    """Extend the skills catalogue with numbered variants of existing skills to reach a target size."""
+    expanded = list(skills)
+    variant = 2
+    while len(expanded) < target:
+        expanded.extend(f"{skill} ({variant})" for skill in skills[: target - len(expanded)])
+        variant += 1
+    return expanded[:target]
+
+
+def _reset_and_seed_skills(db: DatabaseClient, skills_target: int, seed: int) -> None:
+    db.migrate_downgrade()
+    db.migrate_upgrade()
+
+    faker = Faker("en_GB")
+    faker.seed_instance(seed)
+    phases = [faker.date_time_between(start_date="-1y", end_date="now") for _ in range(4)]
+    phases_weighted = OrderedDict([(phases[0], 50), (phases[1], 30), (phases[2], 5), (phases[3], 15)])
+    skills = _expand_skills(_load_skills_flat(), skills_target)
+    insert_skills(db=db, faker=faker, skills=skills, phases_weighted=phases_weighted)
+    # numbered variants share the category of the skill they're based on
+    categories = _load_skill_categories()
+    categories = {
+        skill: categories[base]
+        for skill in skills
+        if (base := skill if skill in categories else skill.rsplit(" (", 1)[0]) in categories
+    }
+    insert_skill_categories(db=db, categories=categories)
+
+
+def _load_fixtures(db: DatabaseClient, rng: random.Random) -> dict:
+    """Values used as parameters for benchmarked methods, chosen from the seeded data."""
+    volunteer_ids = [str(i) for i in db.execute(sql=text("SELECT id FROM v1.volunteer;")).scalars().all()]
+    skill_ids = [str(i) for i in db.execute(sql=text("SELECT id FROM v1.skill;")).scalars().all()]
+    popular_skills = (
+        db.execute(
+            sql=text("""
+            SELECT s.name
+            FROM v1.volunteer_skill vs JOIN v1.skill s ON vs.skill_id = s.id
+            GROUP BY s.name
+            ORDER BY count(*) DESC
+            LIMIT 20;
+            """)
+        )
+        .scalars()
+        .all()
+    )
+    updated_after = db.execute(
+        sql=text("SELECT percentile_disc(0.9) WITHIN GROUP (ORDER BY updated_at) FROM v1.skill;")
+    )
+    volunteer_names = db.execute(
+        sql=text("SELECT family_name FROM v1.volunteer TABLESAMPLE SYSTEM (10) LIMIT 1000;")
+    ).scalars()
+    return {
+        "volunteer_ids": rng.sample(volunteer_ids, k=min(len(volunteer_ids), 1000)),
+        "volunteer_names": list(volunteer_names) or [""],
+        "skill_ids": skill_ids,
+        "popular_skills": list(popular_skills),
+        "updated_after": updated_after.scalar(),
+        "volunteer_skills": db.execute(sql=text("SELECT count(*) FROM v1.volunteer_skill;")).scalar(),
+    }
+
+
+def _explain(db: DatabaseClient, statements: list[tuple[str, object]]) -> list[dict]:
+    """
+    Capture query plans for statements executed by a method.
+
+    Statements are explained with `ANALYZE` (i.e. run) within a transaction that is always rolled back, so writes are
+    safe to explain.
+    """
+    plans = []
+    with db.engine.connect() as conn:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            conn.begin()
+            try:
+                result = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters)
+                plans.append({"statement": statement, "plan": result.scalar()})
+            finally:
+                conn.rollback()
+    return plans
+
+
+def _run_case(
+    make_client: Callable[[], VolunteerSkillsClient],
+    client_engine: Engine,
+    db: DatabaseClient,
+    case: Case,
+    fixtures: dict,
+    size: str,
+    repeat: int,
+    seed: int,
+    explain: bool,
+) -> list[Result]:
+    """
+    Time a method cold (app caches cleared before each call) and warm (repeated calls with caches populated).
+
+    Writes bypass caches so are only timed cold. A new client (and so skill index, if used) is made for each cold call.
+
+    If explaining, statements are captured from the engine used by clients (`client_engine`), as they don't use the
+    database client's engine.
+    """
+    results = []
+    client = make_client()
+    modes = ["cold"] if case.write else ["cold", "warm"]
+    for mode in modes:
+        rng = random.Random(seed)
+        samples = []
+        rows = 0
+        statements: list[tuple[str, object]] = []
+
+        def _capture(conn, cursor, statement, parameters, context, executemany, statements=statements) -> None:
+            statements.append((statement, parameters))
+
+        if mode == "warm":
+            case.call(client, rng, fixtures)
+            rng = random.Random(seed)
+        for i in range(repeat):
+            if mode == "cold":
+                st.cache_data.clear()
+                client = make_client()
+            if i == 0 and explain:
+                event.listen(client_engine, "before_cursor_execute", _capture)
+            started = perf_counter()
+            result = case.call(client, rng, fixtures)
+            samples.append(perf_counter() - started)
+            if i == 0 and explain:
+                event.remove(client_engine, "before_cursor_execute", _capture)
+            rows = case.rows(result, fixtures)
+
+        p50, p95, p99 = _percentiles(samples)
+        results.append(
+            Result(
+                size=size,
+                case=case.name,
+                mode=mode,
+                samples=len(samples),
+                p50_ms=round(p50 * 1000, 3),
+                p95_ms=round(p95 * 1000, 3),
+                p99_ms=round(p99 * 1000, 3),
+                rows=rows,
+                rows_per_sec=round(rows / p50, 1) if p50 else 0,
+                plans=_explain(db=db, statements=statements) if explain and mode == "cold" else [],
+            )
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark VolunteerSkillsClient methods. WARNING: resets the target database."
+    )
+    parser.add_argument("dsn", help="connection string for a local, disposable, database")
+    parser.add_argument("--volunteers", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--skills", type=int, nargs="+", default=[300, 3_000])
+    parser.add_argument("--repeat", type=int, default=20, help="calls per method and mode")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--index", action="store_true", help="use an in-memory skill index in the client")
+    parser.add_argument("--explain", action="store_true", help="capture EXPLAIN (ANALYZE, BUFFERS) plans")
+    parser.add_argument("--output", type=Path, default=Path("benchmark.json"))
+    parser.add_argument("--baseline", type=Path, help="results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown vs. baseline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger = logging.getLogger("app")
+    logger.setLevel(logging.INFO)
+    set_log_level("error")
+
+    db = DatabaseClient(engine=make_engine(dsn=args.dsn), logger=logger)
+    conn = st.connection("benchmark", type="sql", url=args.dsn)
+
+    def make_client() -> VolunteerSkillsClient:
+        return VolunteerSkillsClient(conn=conn, index=SkillIndex() if args.index else None)
+
+    results: list[Result] = []
+    for skills_target in args.skills:
+        _reset_and_seed_skills(db=db, skills_target=skills_target, seed=args.seed)
+        for volunteers_target in sorted(args.volunteers):
+            insert_volunteers_bulk(
+                db=db,
+                logger=logger,
+                volunteer_target=volunteers_target,
+                batch_size=10_000,
+                workers=4,
+                seed=args.seed,
+            )
+            db.execute(sql=text("ANALYZE;"))
+            fixtures = _load_fixtures(db=db, rng=random.Random(args.seed))
+            size = f"{volunteers_target}x{skills_target}"
+            for case in CASES:
+                if case.index_only and not args.index:
+                    continue
+                logger.info(f"Benchmarking {case.name} at {size}")
+                results.extend(
+                    _run_case(
+                        make_client=make_client,
+                        client_engine=conn.engine,
+                        db=db,
+                        case=case,
+                        fixtures=fixtures,
+                        size=size,
+                        repeat=args.repeat,
+                        seed=args.seed,
+                        explain=args.explain,
+                    )
+                )
+    db.log_metrics()
+
+    output = {
+        "created_at": datetime.now(tz=UTC).isoformat(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("dsn", "output", "baseline")},
+        "results": [asdict(result) for result in results],
+    }
+    with args.output.open(mode="w") as f:
+        json.dump(output, f, indent=2, default=str)
+    logger.info(f"Results written to: {args.output.resolve()}")
+
+    if args.baseline:
+        with args.baseline.open() as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(
+            results=output["results"],
+            baseline=baseline,
+            threshold=args.threshold,
+            keys=("size", "case", "mode"),
+            metric="p50_ms",
+        )
+        for regression in regressions:
+            logger.warning(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
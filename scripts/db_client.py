@@ -1,13 +1,18 @@
+import sys
 from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import cached_property
+from hashlib import sha256
 from logging import Logger
 from pathlib import Path
-from typing import Literal, Self, cast
+from typing import Self, cast
 
 from sqlalchemy import (
+    URL,
     TextClause,
     text,
     Select,
-    CursorResult,
+    Result,
     make_url as sa_make_url,
     create_engine as sa_create_engine,
     Engine,
@@ -19,6 +24,28 @@ from sqlalchemy.exc import DatabaseError as SQLAlchemyDatabaseError
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 MIGRATIONS_ROOT = PROJECT_ROOT / "resources" / "db_migrations"
 
+# statements are measured the same way as by the app
+sys.path.insert(0, str(PROJECT_ROOT))
+from instrumentation import QueryMetrics, mark_cache_miss  # noqa: E402
+
+# Connection pool settings, suited to Neon's pooled (PgBouncer) endpoint:
+# - a small number of persistent connections, as PgBouncer multiplexes them server side
+# - connections are checked before use, as they're dropped when a Neon compute scales to zero
+# - connections are recycled before Neon/PgBouncer idle timeouts would close them
+POOL_OPTIONS = {"pool_size": 5, "max_overflow": 5, "pool_pre_ping": True, "pool_recycle": 240}
+
+# ledger of applied migrations and key for advisory lock held while applying them
+MIGRATIONS_TABLE = "public.schema_migrations"
+MIGRATIONS_LOCK_KEY = 4_617_726_110
+# first line of migrations (e.g. `CREATE INDEX CONCURRENTLY`) that can't be run within a transaction
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+# latest migration applied to databases created before the ledger, recorded (rather than run) by `migrate_baseline()`
+BASELINE_VERSION = "004"
+# Neon pooled (PgBouncer) endpoints have this suffix on the endpoint ID in their host name
+POOLED_HOST_SUFFIX = "-pooler"
+
+Statement = str | Select | TextClause
+
 
 class DatabaseError(Exception):
     """Raised for database errors unless a more specific subclass applies."""
@@ -32,17 +59,90 @@ class DatabaseMigrationError(DatabaseError):
     pass
 
 
+@dataclass(frozen=True)
+class Migration:
+    """
+    A database migration, as a pair of up and down SQL files.
+
+    Files are named `{prefix}-{name}.sql` where prefixes count up from `001` for up migrations, and down from `999`
+    for down migrations (see `db_create_migration.py`). The up prefix is used as the version.
+    """
+
+    version: str
+    name: str
+    up_path: Path
+    down_path: Path
+
+    @cached_property
+    def up_sql(self: Self) -> str:
+        return self.up_path.read_text()
+
+    @cached_property
+    def down_sql(self: Self) -> str:
+        return self.down_path.read_text()
+
+    @property
+    def checksum(self: Self) -> str:
+        """Hash of up migration, to detect migrations changed after being applied."""
+        return sha256(self.up_sql.encode()).hexdigest()
+
+    @staticmethod
+    def is_transactional(sql: str) -> bool:
+        return not sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+    @staticmethod
+    def split_statements(sql: str) -> list[str]:
+        """
+        Split SQL for non-transactional migrations into individual statements.
+
+        Statements must end with a ';' at the end of a line. As this is naive, non-transactional migrations shouldn't
+        include function bodies or other statements containing lines ending in ';'.
+        """
+        statements = []
+        statement = []
+        for line in sql.splitlines():
+            statement.append(line)
+            if line.rstrip().endswith(";"):
+                statements.append("\n".join(statement).strip())
+                statement = []
+        if "\n".join(statement).strip():
+            statements.append("\n".join(statement).strip())
+        return [s for s in statements if not all(line.startswith("--") for line in s.splitlines())]
+
+
+def is_pooled(url: URL) -> bool:
+    """Whether a connection URL is for a pooled (PgBouncer) endpoint, where session state isn't kept."""
+    return POOLED_HOST_SUFFIX in (url.host or "").split(".", 1)[0]
+
+
+def load_migrations(root: Path = MIGRATIONS_ROOT) -> list[Migration]:
+    """Migrations in version order."""
+    down_paths = {path.stem.split("-", 1)[1]: path for path in (root / "down").glob("*.sql")}
+    migrations = []
+    for up_path in sorted((root / "up").glob("*.sql")):
+        version, name = up_path.stem.split("-", 1)
+        try:
+            migrations.append(Migration(version=version, name=name, up_path=up_path, down_path=down_paths[name]))
+        except KeyError as e:
+            msg = f"Missing down migration for: {up_path.name}"
+            raise DatabaseMigrationError(msg) from e
+    return migrations
+
+
 class DatabaseClient:
     """Basic database client based on SQLAlchemy."""
 
-    def __init__(self: Self, engine: Engine, logger: Logger) -> None:
+    def __init__(self: Self, engine: Engine, logger: Logger, metrics: QueryMetrics | None = None) -> None:
         """
         Create client using injected database connection.
 
-        All date times are fetched as UTC.
+        All date times are fetched as UTC. Statements executed by the engine (including via `engine` directly) are
+        recorded in `metrics`.
         """
         self._logger = logger
         self._eng: Engine = engine
+        self._metrics = metrics if metrics is not None else QueryMetrics()
+        self._metrics.instrument(engine)
 
     @property
     def engine(self: Self) -> Engine:
@@ -53,24 +153,63 @@ class DatabaseClient:
         """
         return self._eng
 
-    def execute(self, sql: str | Select | TextClause, params: dict | None = None) -> CursorResult | None:
-        """Simple passthrough to SQLAlchemy connectable"""
-        result = None
-        args = [] if params is None else [params]
+    @property
+    def metrics(self: Self) -> QueryMetrics:
+        """Timings of statements executed by this client."""
+        return self._metrics
+
+    def log_metrics(self: Self) -> None:
+        """Log a summary of statement timings, slowest first."""
+        for row in self._metrics.summary():
+            self._logger.info("Query summary: %s", row)
+
+    def _execute(self: Self, conn: Connection, sql: Statement, params: dict | None = None) -> Result | None:
+        """
+        Execute a statement on a connection and buffer any results.
+
+        Plain strings are executed as driver level SQL (i.e. without parsing bind parameters). Statements are measured
+        by (the start of) their SQL, as they aren't otherwise named.
+        """
+        with self._metrics.measure(" ".join(str(sql).split())[:60]) as measurement:
+            mark_cache_miss()
+            if isinstance(sql, str):
+                result = conn.exec_driver_sql(sql, params) if params is not None else conn.exec_driver_sql(sql)
+            else:
+                result = conn.execute(sql, params)
+            measurement.rows = max(result.rowcount, 0)
+
+        if not result.returns_rows:
+            return None
+        # noinspection PyCallingNonCallable
+        return result.freeze()()
+
+    def execute(self: Self, sql: Statement, params: dict | None = None) -> Result | None:
+        """
+        Execute a statement in a transaction.
+
+        Results are fully buffered so can be used once the connection has been returned to the pool.
+        """
+        return self.execute_many(statements=[(sql, params)])[0]
+
+    def execute_many(self: Self, statements: list[tuple[Statement, dict | None]]) -> list[Result | None]:
+        """
+        Execute statements in order, within a single transaction, on a single connection.
+
+        If any statement fails, all are rolled back. Results are fully buffered, as per `execute()`.
+        """
+        results = []
 
         with self.engine.connect() as conn:
             try:
-                conn.begin()
-                if isinstance(sql, str):
-                    result = conn.exec_driver_sql(sql, *args)
-                result = conn.execute(sql, *args)
-                conn.commit()
+                with conn.begin():
+                    for sql, params in statements:
+                        result = self._execute(conn=conn, sql=sql, params=params)
+                        results.append(result)
             except SQLAlchemyDatabaseError as e:
-                conn.rollback()
                 msg = "Error executing statement"
                 raise DatabaseError(msg) from e
 
-        return result
+        return results
 
     def execute_file(self: Self, path: Path) -> None:
         """Execute SQL statements in a given file."""
@@ -81,41 +220,179 @@ class DatabaseClient:
             self.execute(text(file.read()))
 
     def execute_files_in_path(self: Self, path: Path) -> None:
-        """Execute statements in all SQL files in a given directory."""
+        """Execute statements in all SQL files in a given directory, in a single transaction."""
+        statements = []
         for file_path in sorted(path.glob("*.sql")):
-            self.execute_file(file_path)
-
-    def _migrate(self: Self, direction: Literal["up", "down"]) -> None:
+            with file_path.open() as file:
+                self._logger.info("Executing SQL from: %s", file_path.resolve())
+                statements.append((text(file.read()), None))
+        self.execute_many(statements=statements)
+
+    @staticmethod
+    def _ensure_migrations_table(conn: Connection) -> None:
+        conn.execute(
+            text(f"""
+            CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE}
+            (
+                version    TEXT                     NOT NULL PRIMARY KEY,
+                name       TEXT                     NOT NULL,
+                checksum   TEXT                     NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+            );
+            """)
+        )
+
+    @staticmethod
+    def _applied_checksums(conn: Connection) -> dict[str, str]:
+        results = conn.execute(text(f"SELECT version, checksum FROM {MIGRATIONS_TABLE} ORDER BY version;"))
+        return {version: checksum for version, checksum in results}
+
+    def applied_migrations(self: Self) -> dict[str, str]:
+        """Checksums of applied migrations by version."""
+        with self.engine.begin() as conn:
+            self._ensure_migrations_table(conn)
+            return self._applied_checksums(conn)
+
+    @staticmethod
+    def _is_applied(conn: Connection, migration: Migration, check: bool) -> bool:
+        """Whether a migration is applied, optionally raising an error if it has been changed since."""
+        checksum = DatabaseClient._applied_checksums(conn).get(migration.version)
+        if check and checksum is not None and checksum != migration.checksum:
+            msg = f"Migration {migration.version}-{migration.name} has changed since it was applied"
+            raise DatabaseMigrationError(msg)
+        return checksum is not None
+
+    def _apply_migration(self: Self, conn: Connection, migration: Migration, direction: str) -> None:
         """
-        Migrate DB.
+        Apply a migration up or down and update the ledger.
 
-        Migrations are stored as SQL files included within the project.
+        Migrations are applied within a transaction, holding an advisory lock so concurrent runs (e.g. from overlapping
+        deployments) apply each migration once. As a transaction level lock, this works through a connection pooler.
+
+        Migrations marked as non-transactional are applied a statement at a time holding a session level lock instead.
+        As a pooler may run the lock and unlock on different server connections, these need a direct connection.
         """
+        upgrade = direction == "up"
+        sql = migration.up_sql if upgrade else migration.down_sql
+        lock = {"key": MIGRATIONS_LOCK_KEY}
+        record = {"version": migration.version, "name": migration.name, "checksum": migration.checksum}
+        if upgrade:
+            ledger = text(
+                f"INSERT INTO {MIGRATIONS_TABLE} (version, name, checksum) VALUES (:version, :name, :checksum);"
+            )
+        else:
+            ledger = text(f"DELETE FROM {MIGRATIONS_TABLE} WHERE version = :version;")
+
+        if Migration.is_transactional(sql):
+            with conn.begin():
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key);"), lock)
+                # re-checked once locked in case another run has since applied this migration
+                if self._is_applied(conn=conn, migration=migration, check=upgrade) != upgrade:
+                    conn.execute(text(sql))
+                    conn.execute(ledger, record)
+            return
+
+        if is_pooled(conn.engine.url):
+            msg = (
+                f"Migration {migration.version}-{migration.name} can't run in a transaction so needs a direct "
+                f"(unpooled) connection, set 'direct_url' for the database connection"
+            )
+            raise DatabaseMigrationError(msg)
+
+        conn.execution_options(isolation_level="AUTOCOMMIT")
         try:
-            self.execute_files_in_path(MIGRATIONS_ROOT / direction)
-        except DatabaseError as e:
-            msg = f"Error migrating DB {direction}"
-            raise DatabaseMigrationError(msg) from e
+            conn.execute(text("SELECT pg_advisory_lock(:key);"), lock)
+            try:
+                if self._is_applied(conn=conn, migration=migration, check=upgrade) != upgrade:
+                    for statement in Migration.split_statements(sql):
+                        conn.exec_driver_sql(statement)
+                    conn.execute(ledger, record)
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key);"), lock)
+        finally:
+            conn.commit()
+            conn.execution_options(isolation_level=conn.default_isolation_level)
+
+    def _migrate(self: Self, migrations: list[Migration], direction: str) -> None:
+        """
+        Apply migrations (stored as SQL files included within the project) in order.
+
+        Each migration is applied and recorded separately, so an error leaves earlier migrations in place.
+        """
+        with self.engine.connect() as conn:
+            for migration in migrations:
+                self._logger.info("Migrating %s: %s-%s", direction, migration.version, migration.name)
+                try:
+                    self._apply_migration(conn=conn, migration=migration, direction=direction)
+                except SQLAlchemyDatabaseError as e:
+                    msg = f"Error migrating DB {direction} ({migration.version}-{migration.name})"
+                    raise DatabaseMigrationError(msg) from e
+
+    def migrate_baseline(self: Self, version: str = BASELINE_VERSION) -> None:
+        """
+        Record migrations up to and including a version as applied, without running them.
+
+        For databases migrated before applied migrations were recorded, where re-running earlier migrations would fail
+        (e.g. as later migrations redefine views with different columns).
+        """
+        migrations = [migration for migration in load_migrations() if migration.version <= version]
+        self._logger.info("Recording migrations up to %s as applied...", version)
+        with self.engine.begin() as conn:
+            self._ensure_migrations_table(conn)
+            for migration in migrations:
+                conn.execute(
+                    text(f"""
+                    INSERT INTO {MIGRATIONS_TABLE} (version, name, checksum)
+                    VALUES (:version, :name, :checksum)
+                    ON CONFLICT (version) DO NOTHING;
+                    """),
+                    {"version": migration.version, "name": migration.name, "checksum": migration.checksum},
+                )
+
+    def _is_unrecorded(self: Self, applied: dict[str, str]) -> bool:
+        """Whether the database has a schema but no recorded migrations (i.e. predates the ledger)."""
+        if applied:
+            return False
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT to_regclass('v1.volunteer') IS NOT NULL;")).scalar()
 
     def migrate_upgrade(self: Self) -> None:
-        """Upgrade database to head migration."""
+        """
+        Upgrade database to head migration, applying only pending migrations.
+
+        Databases migrated before applied migrations were recorded must be baselined first (see `migrate_baseline()`).
+        """
         self._logger.info("Upgrading database to head revision...")
-        self._migrate("up")
+        applied = self.applied_migrations()
+        if self._is_unrecorded(applied):
+            msg = (
+                "Database has a schema but no recorded migrations, record existing migrations as applied first "
+                f"(`db_migrate.py baseline`, up to {BASELINE_VERSION} unless a later migration was applied)"
+            )
+            raise DatabaseMigrationError(msg)
+        pending = [migration for migration in load_migrations() if migration.version not in applied]
+        if not pending:
+            self._logger.info("No pending migrations.")
+        self._migrate(migrations=pending, direction="up")
 
     def migrate_downgrade(self: Self) -> None:
-        """Downgrade database to base migration."""
+        """Downgrade database to base migration, reverting applied migrations in reverse order."""
         self._logger.info("Downgrading database to base revision...")
-        self._migrate("down")
+        applied = self.applied_migrations()
+        migrations = [migration for migration in reversed(load_migrations()) if migration.version in applied]
+        self._migrate(migrations=migrations, direction="down")
 
 
-def make_engine(dsn: str, autocommit: bool = False) -> Engine:
+def make_engine(dsn: str, autocommit: bool = False, **pool_options: int | bool) -> Engine:
     """
     Create a SQLAlchemy engine from a connection string.
 
+    Connection pool options default to `POOL_OPTIONS`, any given options override these.
+
     This method is isolated to make the `DatabaseClient` class easier to mock.
     """
     url = sa_make_url(dsn)
-    eng = sa_create_engine(url)
+    eng = sa_create_engine(url, **{**POOL_OPTIONS, **pool_options})
 
     if autocommit:
         return cast("Engine", eng.execution_options(isolation_level="AUTOCOMMIT"))
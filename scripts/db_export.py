@@ -0,0 +1,84 @@
+import argparse
+import json
+import logging
+import shutil
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+from tomllib import load as toml_load
+
+from db_client import make_engine
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# the export is part of the app rather than these scripts
+sys.path.insert(0, str(PROJECT_ROOT))
+from data_export import EXPORT_FORMATS, export, export_delta  # noqa: E402
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def _load_secrets():
+    secrets_path = PROJECT_ROOT / ".streamlit" / "secrets.toml"
+    with secrets_path.open(mode="rb") as f:
+        return toml_load(f)
+
+
+def _load_watermark(state_path: Path) -> datetime | None:
+    if not state_path.exists():
+        return None
+    with state_path.open() as f:
+        return datetime.fromisoformat(json.load(f)["watermark"])
+
+
+def _save_watermark(state_path: Path, watermark: datetime) -> None:
+    with state_path.open("w") as f:
+        json.dump({"watermark": watermark.isoformat()}, f)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger = logging.getLogger("app")
+    logger.setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Export volunteer skills, either in full or only rows changed or deleted since a watermark."
+    )
+    parser.add_argument("--format", choices=EXPORT_FORMATS.keys(), default="csv")
+    parser.add_argument("--output", type=Path, help="defaults to 'volunteer_skills.<format>'")
+    watermark = parser.add_mutually_exclusive_group()
+    watermark.add_argument("--since", type=datetime.fromisoformat, help="export changes since (ISO 8601 date time)")
+    watermark.add_argument(
+        "--state", type=Path, help="JSON file to read the previous watermark from and save the next to (for syncs)"
+    )
+    args = parser.parse_args()
+    output = args.output or Path(f"volunteer_skills.{args.format}")
+
+    secrets = _load_secrets()
+    engine = make_engine(dsn=secrets["connections"]["neon"]["url"])
+
+    since = args.since
+    if args.state is not None:
+        # the first sync includes all rows, as changes
+        since = _load_watermark(args.state) or EPOCH
+
+    if since is None:
+        logger.info("Exporting all volunteer skills")
+        file = export(engine=engine, fmt=args.format)
+    else:
+        since = since if since.tzinfo is not None else since.replace(tzinfo=UTC)
+        logger.info(f"Exporting volunteer skills changed since: {since.isoformat()}")
+        file, next_watermark = export_delta(engine=engine, fmt=args.format, since=since)
+
+    with file, output.open("wb") as f:
+        shutil.copyfileobj(file, f)
+    logger.info(f"Export saved to: {output.resolve()}")
+
+    if since is not None:
+        logger.info(f"Next watermark: {next_watermark.isoformat()}")
+        if args.state is not None:
+            _save_watermark(args.state, next_watermark)
+
+
+if __name__ == "__main__":
+    main()
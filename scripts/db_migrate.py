@@ -3,7 +3,7 @@ import logging
 from pathlib import Path
 from tomllib import load as toml_load
 
-from db_client import DatabaseClient, make_engine
+from db_client import BASELINE_VERSION, DatabaseClient, load_migrations, make_engine
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 MIGRATIONS_ROOT = PROJECT_ROOT / "resources" / "db_migrations"
@@ -21,17 +21,35 @@ def main():
     logger.setLevel(logging.INFO)
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("direction", choices=["up", "down"])
+    parser.add_argument("direction", choices=["up", "down", "status", "baseline"])
+    parser.add_argument(
+        "--version",
+        default=BASELINE_VERSION,
+        help="for 'baseline', the latest migration already applied to a database created before migrations were recorded",
+    )
     args = parser.parse_args()
 
     secrets = _load_secrets()
-    db_dsn = secrets["connections"]["neon"]["url"]
+    # a direct (unpooled) connection is needed for migrations that can't run in a transaction
+    db_dsn = secrets["connections"]["neon"].get("direct_url", secrets["connections"]["neon"]["url"])
     db = DatabaseClient(engine=make_engine(dsn=db_dsn), logger=logger)
 
     if args.direction == "up":
         db.migrate_upgrade()
     elif args.direction == "down":
         db.migrate_downgrade()
+    elif args.direction == "baseline":
+        db.migrate_baseline(version=args.version)
+    elif args.direction == "status":
+        applied = db.applied_migrations()
+        for migration in load_migrations():
+            if migration.version not in applied:
+                status = "pending"
+            elif applied[migration.version] != migration.checksum:
+                status = "changed"
+            else:
+                status = "applied"
+            print(f"{migration.version}-{migration.name}: {status}")
 
 
 if __name__ == "__main__":
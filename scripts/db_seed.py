@@ -1,10 +1,20 @@
+import argparse
+import csv
 import json
 import logging
-from collections import OrderedDict
+import os
+import random
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from io import StringIO
+from itertools import accumulate
 from pathlib import Path
 from tomllib import load as toml_load
+from typing import Iterator
 
 from faker import Faker
+from psycopg2 import Error as Psycopg2Error
 from sqlalchemy import text, Connection
 from sqlalchemy.exc import DatabaseError as SQLAlchemyDatabaseError
 
@@ -26,6 +36,13 @@ def _load_skills_flat() -> list[str]:
     return [skill for skill_group in data.values() for skill in skill_group]
 
 
+def _load_skill_categories() -> dict[str, str]:
+    skills_path = PROJECT_ROOT / "resources" / "data" / "skills.json"
+    with skills_path.open() as f:
+        data = json.load(f)["skills"]
+    return {skill: category for category, skill_group in data.items() for skill in skill_group}
+
+
 def _process_skills(faker: Faker, skills: list[str], phases_weighted: OrderedDict) -> list[dict]:
     skills_ = []
     for skill in skills:
@@ -47,6 +64,19 @@ def _pick_skills_for_volunteer(faker: Faker, skills: list[str]) -> list[str]:
     return list(skills)
 
 
+@contextmanager
+def _trigger_disabled(conn: Connection, table: str, trigger: str) -> Iterator[Connection]:
+    """
+    Disable a trigger within a transaction.
+
+    As DDL is transactional, the trigger is re-enabled if the transaction fails, and isn't disabled for other sessions.
+    """
+    with conn.begin():
+        conn.execute(text(f"ALTER TABLE {table} DISABLE TRIGGER {trigger};"))
+        yield conn
+        conn.execute(text(f"ALTER TABLE {table} ENABLE TRIGGER {trigger};"))
+
+
 def insert_skills(db: DatabaseClient, faker: Faker, skills: list[str], phases_weighted: OrderedDict) -> None:
     values = _process_skills(faker=faker, skills=skills, phases_weighted=phases_weighted)
     placeholders, params = encode_insert_params(values=values)
@@ -56,9 +86,33 @@ def insert_skills(db: DatabaseClient, faker: Faker, skills: list[str], phases_we
     ON CONFLICT (name) DO NOTHING;
     """
 
-    db.execute(sql=text("ALTER TABLE v1.skill DISABLE TRIGGER v1_skill_updated_at;"))
-    db.execute(sql=text(statement), params=params)
-    db.execute(sql=text("ALTER TABLE v1.skill ENABLE TRIGGER v1_skill_updated_at;"))
+    # skill timestamps are set to phases in the past, which the updated at trigger would otherwise overwrite
+    with db.engine.connect() as conn, _trigger_disabled(conn=conn, table="v1.skill", trigger="v1_skill_updated_at"):
+        conn.execute(statement=text(statement), parameters=params)
+
+
+def insert_skill_categories(db: DatabaseClient, categories: dict[str, str]) -> None:
+    """Insert skill categories and set the category of each skill (by skill name)."""
+    params = {"skills": list(categories.keys()), "categories": list(categories.values())}
+    statements = [
+        """
+        INSERT INTO v1.skill_category (name)
+        SELECT DISTINCT unnest(CAST(:categories AS text[]))
+        ON CONFLICT (name) DO NOTHING;
+        """,
+        """
+        UPDATE v1.skill s
+        SET category_id = c.id
+        FROM unnest(CAST(:skills AS text[]), CAST(:categories AS text[])) AS u(skill, category)
+               JOIN v1.skill_category c ON c.name = u.category
+        WHERE s.name = u.skill AND s.category_id IS DISTINCT FROM c.id;
+        """,
+    ]
+
+    # as with inserting skills, setting categories shouldn't count as updating skills
+    with db.engine.connect() as conn, _trigger_disabled(conn=conn, table="v1.skill", trigger="v1_skill_updated_at"):
+        for statement in statements:
+            conn.execute(statement=text(statement), parameters=params)
 
 
 def _insert_volunteer(conn: Connection, faker: Faker, skills: list[str]) -> None:
@@ -104,11 +158,8 @@ def _insert_volunteer(conn: Connection, faker: Faker, skills: list[str]) -> None
         raise RuntimeError(msg) from e
 
 
-def insert_volunteers(db: DatabaseClient, faker: Faker, logger: logging.Logger, phases_weighted: OrderedDict) -> None:
-    volunteer_target = 42
-    volunteer_count = db.execute(sql=text("SELECT COUNT(*) FROM v1.volunteer;")).scalar()
-
-    # get skills upto the penultimate phase
+def _select_skills_subset(db: DatabaseClient) -> list[str]:
+    """Get skills upto the penultimate phase."""
     results = db.execute(
         sql=text("""
         SELECT id
@@ -117,7 +168,12 @@ def insert_volunteers(db: DatabaseClient, faker: Faker, logger: logging.Logger,
             SELECT distinct(created_at) FROM v1.skill ORDER BY created_at DESC OFFSET 1 LIMIT 1
         );""")
     )
-    skills_subset = [str(skill_id) for skill_id in results.scalars().all()]
+    return [str(skill_id) for skill_id in results.scalars().all()]
+
+
+def insert_volunteers(db: DatabaseClient, faker: Faker, logger: logging.Logger, volunteer_target: int) -> None:
+    volunteer_count = db.execute(sql=text("SELECT COUNT(*) FROM v1.volunteer;")).scalar()
+    skills_subset = _select_skills_subset(db=db)
 
     if volunteer_count >= volunteer_target:
         logger.info(f"Target count of {volunteer_target} volunteers reached.")
@@ -129,7 +185,138 @@ def insert_volunteers(db: DatabaseClient, faker: Faker, logger: logging.Logger,
             _insert_volunteer(conn=conn, faker=faker, skills=skills_subset)
 
 
+def _skill_popularity(seed: int, skills: list[str]) -> tuple[list[int], list[float]]:
+    """
+    Assign skills a Zipf like popularity, so a few skills are common and most are rare.
+
+    Returns skill IDs in a random (but seeded) order of popularity, and cumulative weights for use with `random.choices`.
+    """
+    skill_ids = [int(skill_id) for skill_id in skills]
+    random.Random(seed).shuffle(skill_ids)
+    weights = [1 / rank for rank in range(1, len(skill_ids) + 1)]
+    return skill_ids, list(accumulate(weights))
+
+
+def _pick_weighted_skills(rng: random.Random, skill_ids: list[int], cum_weights: list[float], count: int) -> set[int]:
+    picked: set[int] = set()
+    count = min(count, len(skill_ids))
+    while len(picked) < count:
+        picked.update(rng.choices(skill_ids, cum_weights=cum_weights, k=count - len(picked)))
+    return picked
+
+
+def _generate_volunteers(
+    seed: int, volunteer_ids: list[int], skill_ids: list[int], cum_weights: list[float]
+) -> tuple[str, str]:
+    """
+    Generate a batch of volunteers and their skills as CSV for use with `COPY`.
+
+    Run in worker processes. Volunteer IDs are allocated in advance so volunteer skills can be generated at the same
+    time. Emails include the volunteer ID to remain unique for large numbers of volunteers.
+    """
+    faker = Faker("en_GB")
+    faker.seed_instance(seed)
+    rng = random.Random(seed)
+
+    volunteers = StringIO()
+    volunteer_skills = StringIO()
+    volunteers_writer = csv.writer(volunteers)
+    volunteer_skills_writer = csv.writer(volunteer_skills)
+
+    for volunteer_id in volunteer_ids:
+        given_name = faker.first_name()
+        family_name = faker.last_name()
+        email = f"{given_name.lower()[:1]}{family_name.lower()}.{volunteer_id}@mapaction.org.com"
+        volunteers_writer.writerow([volunteer_id, given_name, family_name, email])
+
+        count = rng.randint(2, 25)
+        for skill_id in _pick_weighted_skills(rng=rng, skill_ids=skill_ids, cum_weights=cum_weights, count=count):
+            volunteer_skills_writer.writerow([volunteer_id, skill_id])
+
+    return volunteers.getvalue(), volunteer_skills.getvalue()
+
+
+def _copy_volunteers(db: DatabaseClient, volunteers: str, volunteer_skills: str) -> None:
+    """
+    Load a batch of generated volunteers and their skills using `COPY`, in a single transaction.
+
+    Volunteer skill triggers run once per `COPY` statement (rather than per row) so don't need disabling.
+    """
+    try:
+        with db.engine.begin() as conn, conn.connection.cursor() as cursor:
+            cursor.copy_expert(
+                "COPY v1.volunteer (id, given_name, family_name, email) FROM STDIN WITH (FORMAT csv);",
+                StringIO(volunteers),
+            )
+            cursor.copy_expert(
+                "COPY v1.volunteer_skill (volunteer_id, skill_id) FROM STDIN WITH (FORMAT csv);",
+                StringIO(volunteer_skills),
+            )
+    except Psycopg2Error as e:
+        msg = "Error copying volunteers and/or volunteer skills"
+        raise RuntimeError(msg) from e
+
+
+def _allocate_volunteer_ids(db: DatabaseClient, count: int) -> list[int]:
+    results = db.execute(
+        sql=text("""
+        SELECT nextval(pg_get_serial_sequence('v1.volunteer', 'id'))
+        FROM generate_series(1, :count);
+        """),
+        params={"count": count},
+    )
+    return list(results.scalars().all())
+
+
+def insert_volunteers_bulk(
+    db: DatabaseClient, logger: logging.Logger, volunteer_target: int, batch_size: int, workers: int, seed: int
+) -> None:
+    """
+    Insert large numbers of volunteers using `COPY`.
+
+    Volunteers are generated in batches by a pool of worker processes and loaded (and committed) a batch at a time.
+    At most two batches per worker are in flight to bound memory use. Skills are picked using a skewed popularity.
+    """
+    volunteer_count = db.execute(sql=text("SELECT COUNT(*) FROM v1.volunteer;")).scalar()
+    if volunteer_count >= volunteer_target:
+        logger.info(f"Target count of {volunteer_target} volunteers reached.")
+        return
+
+    skill_ids, cum_weights = _skill_popularity(seed=seed, skills=_select_skills_subset(db=db))
+    remaining = volunteer_target - volunteer_count
+    batches = [min(batch_size, remaining - start) for start in range(0, remaining, batch_size)]
+
+    inserted = 0
+    pending: deque[Future] = deque()
+
+    def _load_next() -> None:
+        nonlocal inserted
+        volunteers, volunteer_skills = pending.popleft().result()
+        _copy_volunteers(db=db, volunteers=volunteers, volunteer_skills=volunteer_skills)
+        inserted += volunteers.count("\n")
+        logger.info(f"Inserted volunteer {volunteer_count + inserted} of {volunteer_target}")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for i, count in enumerate(batches):
+            volunteer_ids = _allocate_volunteer_ids(db=db, count=count)
+            pending.append(executor.submit(_generate_volunteers, seed + i, volunteer_ids, skill_ids, cum_weights))
+            if len(pending) >= workers * 2:
+                _load_next()
+        while pending:
+            _load_next()
+
+    db.execute(sql=text("ANALYZE v1.volunteer, v1.volunteer_skill, v1.volunteer_skill_set, v1.volunteer_skill_update;"))
+
+
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--volunteers", type=int, default=42, help="target number of volunteers")
+    parser.add_argument("--bulk", action="store_true", help="use COPY with worker processes for large targets")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="volunteers per bulk batch/transaction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes for bulk generation")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible data")
+    args = parser.parse_args()
+
     logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     logger = logging.getLogger("app")
     logger.setLevel(logging.INFO)
@@ -139,13 +326,27 @@ def main():
     db = DatabaseClient(engine=make_engine(dsn=db_dsn), logger=logger)
 
     faker = Faker("en_GB")
+    if args.seed is not None:
+        faker.seed_instance(args.seed)
     # generate 4 random date times in the past at which skills were added, weighted such that 1st at 50%, 2nd at 30%, 3rd at 5%, 4th at 15%
     phases = [faker.date_time_between(start_date="-1y", end_date="now") for _ in range(4)]
     phases_weighted = OrderedDict([(phases[0], 50), (phases[1], 30), (phases[2], 5), (phases[3], 15)])
     skills = _load_skills_flat()
 
     insert_skills(db=db, faker=faker, skills=skills, phases_weighted=phases_weighted)
-    insert_volunteers(db=db, faker=faker, logger=logger, phases_weighted=phases_weighted)
+    insert_skill_categories(db=db, categories=_load_skill_categories())
+    if args.bulk:
+        insert_volunteers_bulk(
+            db=db,
+            logger=logger,
+            volunteer_target=args.volunteers,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            seed=args.seed or 0,
+        )
+    else:
+        insert_volunteers(db=db, faker=faker, logger=logger, volunteer_target=args.volunteers)
+    db.log_metrics()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+import argparse
+import json
+import logging
+import subprocess
+import sys
+from pathlib import Path
+from statistics import median
+
+from regressions import compare
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# modules imported by pages (which can't be imported directly as they render on import)
+DEFAULT_MODULES = ["shared", "data_export", "skill_index", "skill_query", "instrumentation", "streamlit_condition_tree"]
+# imported by Streamlit itself before running the app, so excluded from each module's time
+BASELINE_MODULE = "streamlit"
+
+
+def _parse_importtime(stderr: str) -> dict[str, int]:
+    """
+    Cumulative import times (in microseconds) by module from `-X importtime` output.
+
+    Only modules imported after the baseline module (i.e. not by Streamlit) are included.
+    """
+    times: dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.removeprefix("import time:").split("|")
+        if module.strip() == BASELINE_MODULE:
+            times.clear()
+            continue
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def measure(module: str, repeat: int) -> dict:
+    """
+    Time importing a module in fresh interpreters, after Streamlit has been imported.
+
+    Returns the median cumulative time for the module and its slowest (direct or indirect) dependencies.
+    """
+    samples = []
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {BASELINE_MODULE}; import {module}"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        samples.append(_parse_importtime(process.stderr))
+
+    own = [sample.get(module, 0) for sample in samples]
+    dependencies = {name for sample in samples for name in sample if name != module}
+    slowest = sorted(
+        ((name, median(sample.get(name, 0) for sample in samples)) for name in dependencies),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return {
+        "module": module,
+        "median_ms": round(median(own) / 1000, 1),
+        "min_ms": round(min(own) / 1000, 1),
+        "slowest": [{"module": name, "median_ms": round(us / 1000, 1)} for name, us in slowest[:10]],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure import times of app modules (after Streamlit).")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="interpreters to start per module")
+    parser.add_argument("--output", type=Path, default=Path("import_time.json"))
+    parser.add_argument("--baseline", type=Path, help="results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown vs. baseline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger = logging.getLogger("app")
+    logger.setLevel(logging.INFO)
+
+    results = []
+    for module in args.modules:
+        result = measure(module=module, repeat=args.repeat)
+        slowest = ", ".join(f"{d['module']} ({d['median_ms']}ms)" for d in result["slowest"][:3])
+        logger.info(f"{module}: {result['median_ms']}ms (slowest: {slowest or '-'})")
+        results.append(result)
+
+    with args.output.open("w") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Results saved to: {args.output.resolve()}")
+
+    if args.baseline:
+        with args.baseline.open() as f:
+            regressions = compare(
+                results=results, baseline=json.load(f), threshold=args.threshold, keys=("module",), metric="median_ms"
+            )
+        for regression in regressions:
+            logger.warning(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
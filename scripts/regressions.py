@@ -0,0 +1,20 @@
+def compare(
+    results: list[dict], baseline: list[dict], threshold: float, keys: tuple[str, ...], metric: str
+) -> list[str]:
+    """
+    Describe results slower than the baseline by more than a threshold (as a fraction).
+
+    Results are matched to the baseline by the values of `keys` and compared by the value of `metric` (a time in ms).
+    Results without a matching (non-zero) baseline are skipped.
+    """
+    baseline_ = {tuple(r[key] for key in keys): r for r in baseline}
+    regressions = []
+    for result in results:
+        key = tuple(result[key] for key in keys)
+        base = baseline_.get(key)
+        if base is None or not base[metric]:
+            continue
+        ratio = result[metric] / base[metric]
+        if ratio > 1 + threshold:
+            regressions.append(f"{' '.join(map(str, key))}: {metric} {base[metric]} -> {result[metric]} (x{ratio:.2f})")
+    return regressions
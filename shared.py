@@ -1,138 +1,634 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import timedelta, datetime
 from pathlib import Path
+from time import perf_counter
 from tomllib import load as toml_load
-from typing import Set
+from typing import BinaryIO, Set
 
 import streamlit as st
-from pandas import Timestamp, DataFrame
-from sqlalchemy import text
+from pandas import DataFrame, Timestamp, read_sql
+from sqlalchemy import Connection, Engine, text
 from sqlalchemy.exc import DatabaseError
 from streamlit.connections import SQLConnection
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-from scripts.db_client import encode_insert_params
+from data_export import ExportFormat, export as export_to_file
+from instrumentation import SLOW_QUERY_THRESHOLD, QueryMetrics, mark_cache_miss
+from scripts.db_client import POOL_OPTIONS
+from skill_cooccurrence import SkillAssociation
+from skill_index import RankedVolunteer, SkillIndex
+from skill_saves import SkillSave, SkillSaveConflictError, SkillSaveQueue
+from skill_query import Plan, evaluate, optimise, to_sql
+
+# how often to check if data has changed, and how long results are cached if unchanged (as a backstop for changes not
+# reflected in the data version, such as deleted volunteers, or changes committed out of order)
+DATA_VERSION_TTL = timedelta(seconds=30)
+QUERY_TTL = timedelta(hours=6)
+
+UNCATEGORISED = "Other"
+
+logger = logging.getLogger(__name__)
+
+
+def _to_mapping(df: DataFrame, key: str, value: str) -> dict[str, str]:
+    """
+    Mapping between two columns of a query result, e.g. IDs to names, with keys as strings.
+
+    Built column-wise, rather than per row, as results may be shaped on each rerun.
+    """
+    return dict(zip(df[key].astype(str).tolist(), df[value].tolist()))
+
+
+@dataclass(frozen=True)
+class StatsSnapshot:
+    """Aggregate volunteer and skill statistics, as of a single point in time."""
+
+    count_volunteers: int
+    count_skills_possible: int
+    count_skills_available: int
+    chart_volunteers_skills: dict[str, int]
+    chart_skills: dict[str, int]
+    category_stats: dict[str, dict[str, int]]
+
+
+@dataclass(frozen=True)
+class VolunteerContext:
+    """Everything needed to update a volunteer's skills."""
+
+    volunteer_id: str
+    skills: dict[str, str]
+    skill_categories: dict[str, str]
+    selected_skill_ids: frozenset[str]
+    new_skill_ids: frozenset[str]
+    last_updated_at: Timestamp | None
 
 
 class VolunteerSkillsClient:
-    def __init__(self, conn: SQLConnection):
+    def __init__(self, conn: SQLConnection, index: SkillIndex | None = None, metrics: QueryMetrics | None = None):
         self._conn = conn
+        self._index = index
+        self._metrics = metrics if metrics is not None else QueryMetrics()
+
+    def _query(self, name: str, sql: str, params: dict | None = None) -> DataFrame:
+        """Run a named read query, cached until data changes (see `data_version()`)."""
+        engine = self._conn.engine
+        with self._metrics.measure("data_version"):
+            version = data_version(_engine=engine)
+        with self._metrics.measure(name) as measurement:
+            df = _cached_query(_engine=engine, sql=sql, params=params, version=version)
+            measurement.rows = len(df)
+        return df
 
     @property
     def volunteers(self) -> dict[str, str]:
-        df = self._conn.query(
-            sql="SELECT id, given_name, family_name FROM v1.volunteer ORDER BY given_name;", ttl=timedelta(minutes=10)
+        df = self._query(
+            name="volunteers",
+            sql="""
+            SELECT id, given_name || ' ' || family_name AS name
+            FROM v1.volunteer
+            ORDER BY given_name, family_name, id;
+            """,
+        )
+        return _to_mapping(df, key="id", value="name")
+
+    def search_volunteers(self, fragment: str, limit: int = 20) -> dict[str, str]:
+        """
+        Volunteers whose name contains a fragment (case-insensitive), most similar first, limited to top matches.
+
+        Uses a trigram index on volunteer names. If the fragment is empty, the first volunteers by name are returned.
+        """
+        fragment = fragment.strip()
+        pattern = "%" + fragment.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        df = self._query(
+            name="search_volunteers",
+            sql="""
+            SELECT id, given_name || ' ' || family_name AS name
+            FROM v1.volunteer
+            WHERE given_name || ' ' || family_name ILIKE :pattern
+            ORDER BY similarity(given_name || ' ' || family_name, :fragment) DESC, given_name, family_name, id
+            LIMIT :limit;
+            """,
+            params={"pattern": pattern, "fragment": fragment, "limit": limit},
         )
-        return {str(row["id"]): f"{row['given_name']} {row['family_name']}" for _, row in df.iterrows()}
+        return _to_mapping(df, key="id", value="name")
 
     @property
     def possible_skills(self) -> dict[str, str]:
-        df = self._conn.query(sql="SELECT id, name FROM v1.skill ORDER BY name;", ttl=timedelta(minutes=10))
-        return {str(row["id"]): row["name"] for _, row in df.iterrows()}
+        df = self._query(name="possible_skills", sql="SELECT id, name FROM v1.skill ORDER BY name;")
+        return _to_mapping(df, key="id", value="name")
+
+    @property
+    def skill_categories(self) -> list[str]:
+        df = self._query(name="skill_categories", sql="SELECT name FROM v1.skill_category ORDER BY name;")
+        return df["name"].tolist()
+
+    @property
+    def _skill_ids_by_name(self) -> dict[str, int]:
+        return {name: int(skill_id) for skill_id, name in self.possible_skills.items()}
 
     @property
     def available_skills(self) -> list[str]:
-        df = self._conn.query(sql="SELECT distinct(name) FROM v1.skill;", ttl=timedelta(minutes=10))
-        return sorted(list(df["name"]))
+        df = self._query(name="available_skills", sql="SELECT distinct(name) FROM v1.skill;")
+        return sorted(df["name"].tolist())
+
+    @property
+    def stats_snapshot(self) -> "StatsSnapshot":
+        """
+        Dashboard statistics, computed in a single statement so they're consistent with each other.
+
+        Cached as a unit, so all statistics are refreshed together when data changes.
+        """
+        df = self._query(
+            name="stats_snapshot",
+            sql="""
+            SELECT (SELECT count(id) FROM v1.volunteer) AS count_volunteers,
+                   (SELECT count(id) FROM v1.skill) AS count_skills_possible,
+                   (SELECT count(distinct(skill_id)) FROM v1.volunteer_skill) AS count_skills_available,
+                   (SELECT coalesce(json_object_agg(
+                                v.given_name || ' ' || v.family_name, cardinality(vss.skill_ids)
+                            ), '{}')
+                    FROM v1.volunteer_skill_set vss
+                           JOIN v1.volunteer v ON vss.volunteer_id = v.id) AS chart_volunteers_skills,
+                   (SELECT coalesce(json_object_agg(sc.skill, sc.volunteer_count), '{}')
+                    FROM (SELECT s.name AS skill, COUNT(vss.volunteer_id) AS volunteer_count
+                          FROM v1.volunteer_skill_set vss
+                                 CROSS JOIN LATERAL unnest(vss.skill_ids) AS u(skill_id)
+                                 JOIN v1.skill s ON u.skill_id = s.id
+                          GROUP BY s.name) sc) AS chart_skills,
+                   (SELECT coalesce(json_object_agg(cs.category, json_build_object(
+                                'skills', cs.skills,
+                                'skills_available', cs.skills_available,
+                                'volunteers', cs.volunteers
+                            )), '{}')
+                    FROM (SELECT c.name AS category,
+                                 count(DISTINCT s.id) AS skills,
+                                 count(DISTINCT vs.skill_id) AS skills_available,
+                                 count(DISTINCT vs.volunteer_id) AS volunteers
+                          FROM v1.skill_category c
+                                 JOIN v1.skill s ON s.category_id = c.id
+                                 LEFT JOIN v1.volunteer_skill vs ON vs.skill_id = s.id
+                          GROUP BY c.name) cs) AS category_stats;
+            """,
+        )
+        row = df.iloc[0]
+        return StatsSnapshot(
+            count_volunteers=int(row["count_volunteers"]),
+            count_skills_possible=int(row["count_skills_possible"]),
+            count_skills_available=int(row["count_skills_available"]),
+            chart_volunteers_skills=row["chart_volunteers_skills"],
+            chart_skills=row["chart_skills"],
+            category_stats=row["category_stats"],
+        )
 
     @property
     def count_volunteers(self) -> int:
-        df = self._conn.query(sql="SELECT count(id) FROM v1.volunteer;", ttl=timedelta(minutes=10))
-        return df.iloc[0, 0]
+        return self.stats_snapshot.count_volunteers
 
     @property
     def count_skills_possible(self) -> int:
-        df = self._conn.query(sql="SELECT count(id) FROM v1.skill;", ttl=timedelta(minutes=10))
-        return df.iloc[0, 0]
+        return self.stats_snapshot.count_skills_possible
 
     @property
     def count_skills_available(self) -> int:
-        df = self._conn.query(
-            sql="SELECT count(distinct(skill_id)) FROM v1.volunteer_skill;", ttl=timedelta(minutes=10)
-        )
-        return df.iloc[0, 0]
+        return self.stats_snapshot.count_skills_available
 
     @property
     def chart_volunteers_skills(self) -> dict[str, int]:
-        df = self._conn.query(
-            sql="SELECT volunteer, array_length(skills, 1) AS skills_count FROM v1.volunteer_skills;",
-            ttl=timedelta(minutes=10),
-        )
-        return df.set_index("volunteer")["skills_count"].to_dict()
+        return self.stats_snapshot.chart_volunteers_skills
 
     @property
     def chart_skills(self) -> dict[str, int]:
-        df = self._conn.query(
-            """
-        SELECT skill, COUNT(volunteer) AS volunteer_count
-        FROM (
-            SELECT volunteer, unnest(skills) AS skill
-            FROM v1.volunteer_skills
-        ) AS unnest_skills
-        GROUP BY skill;
-        """,
-            ttl=timedelta(minutes=10),
-        )
-        return df.set_index("skill")["volunteer_count"].to_dict()
+        return self.stats_snapshot.chart_skills
 
-    @property
-    def export(self) -> DataFrame:
-        return self._conn.query(sql="SELECT * FROM v1.volunteer_skills_export;", ttl=timedelta(minutes=10))
+    def export(self, fmt: ExportFormat) -> BinaryIO:
+        return export_to_file(engine=self._conn.engine, fmt=fmt)
 
     def filter_skills_by_volunteer(self, volunteer_id: str) -> list[str]:
-        df = self._conn.query(
+        df = self._query(
+            name="filter_skills_by_volunteer",
             sql="SELECT skill_id FROM v1.volunteer_skill WHERE volunteer_id = :volunteer_id;",
             params={"volunteer_id": volunteer_id},
-            ttl=0,
         )
-        return [str(row["skill_id"]) for _, row in df.iterrows()]
+        return df["skill_id"].astype(str).tolist()
 
     def filter_skills_updated_after(self, date: datetime) -> dict[str, str]:
-        df = self._conn.query(
+        df = self._query(
+            name="filter_skills_updated_after",
             sql="SELECT id, name FROM v1.skill WHERE updated_at > :date ORDER BY name;",
             params={"date": date},
-            ttl=timedelta(minutes=10),
         )
-        return {str(row["id"]): row["name"] for _, row in df.iterrows()}
+        return _to_mapping(df, key="id", value="name")
 
     def filter_volunteers_by_skills(self, skills: Set[str]) -> list[str]:
-        placeholders = ", ".join([f":skill_{i}" for i in range(len(skills))])
-        query = f"SELECT volunteer FROM v1.volunteer_skills WHERE skills @> ARRAY[{placeholders}];"
-        params = {f"skill_{i}": skill for i, skill in enumerate(skills)}
-        df = self._conn.query(sql=query, params=params, ttl=timedelta(minutes=10))
-        return sorted(list(set(df["volunteer"])))
+        if self._index is not None:
+            self._index.refresh(engine=self._conn.engine)
+            return self._index.filter(skills)
+
+        skill_ids = self._skill_ids_by_name
+        if not skills.issubset(skill_ids):
+            return []
+
+        df = self._query(
+            name="filter_volunteers_by_skills",
+            sql="""
+            SELECT v.given_name || ' ' || v.family_name AS volunteer
+            FROM v1.volunteer_skill_set vss
+                   JOIN v1.volunteer v ON vss.volunteer_id = v.id
+            WHERE vss.skill_ids @> CAST(:skill_ids AS int[]);
+            """,
+            params={"skill_ids": sorted(skill_ids[skill] for skill in skills)},
+        )
+        return sorted(set(df["volunteer"]))
+
+    def rank_volunteers_by_skills(
+        self, skills: Set[str], weights: dict[str, float] | None = None, limit: int = 10
+    ) -> list[RankedVolunteer]:
+        """
+        Volunteers with the most (or most important) of a set of skills, best matches first.
+
+        Volunteers are scored by the total weight of the given skills they have (weights default to 1, i.e. a count).
+        Volunteers with none of the skills are not included.
+        """
+        weights = {skill: (weights or {}).get(skill, 1.0) for skill in skills}
+        if self._index is not None:
+            self._index.refresh(engine=self._conn.engine)
+            return self._index.rank(weights=weights, limit=limit)
+
+        skill_ids = self._skill_ids_by_name
+        known = sorted(skill for skill in weights if skill in skill_ids)
+        if not known:
+            return []
+
+        # scores are only computed for volunteers with at least one skill, found using the volunteer skill index
+        df = self._query(
+            name="rank_volunteers_by_skills",
+            sql="""
+            SELECT v.given_name || ' ' || v.family_name AS volunteer,
+                   sum(r.weight) AS score,
+                   array_agg(r.name ORDER BY r.name) AS matched
+            FROM unnest(CAST(:skill_ids AS int[]), CAST(:names AS text[]), CAST(:weights AS float8[]))
+                   AS r(skill_id, name, weight)
+                   JOIN v1.volunteer_skill vs ON vs.skill_id = r.skill_id
+                   JOIN v1.volunteer v ON vs.volunteer_id = v.id
+            GROUP BY v.id
+            ORDER BY score DESC, volunteer
+            LIMIT :limit;
+            """,
+            params={
+                "skill_ids": [skill_ids[skill] for skill in known],
+                "names": known,
+                "weights": [weights[skill] for skill in known],
+                "limit": limit,
+            },
+        )
+        return [
+            RankedVolunteer(
+                name=name,
+                score=float(score),
+                matched=tuple(matched),
+                missing=tuple(sorted(weights.keys() - set(matched))),
+            )
+            for name, score, matched in zip(df["volunteer"].tolist(), df["score"].tolist(), df["matched"].tolist())
+        ]
+
+    def _require_index(self) -> SkillIndex:
+        # not supported without an index, as finding pairs of skills using self joins is quadratic per volunteer
+        if self._index is None:
+            raise RuntimeError("Skill associations require a skill index")
+        self._index.refresh(engine=self._conn.engine)
+        return self._index
+
+    def skill_associations(self, limit: int = 10) -> list[SkillAssociation]:
+        """Pairs of skills most often held together (relative to how common each is), strongest first."""
+        return self._require_index().associations(limit=limit)
+
+    def suggest_skills(self, skill_ids: Set[str], limit: int = 5) -> list[SkillAssociation]:
+        """Skills (by ID) usually held by volunteers with some of the given skills, most likely first."""
+        return self._require_index().suggest(skill_ids={int(skill_id) for skill_id in skill_ids}, limit=limit)
+
+    def filter_volunteers_by_categories(self, categories: Set[str]) -> list[str]:
+        """Names of volunteers with any skill in any of the given categories (by name)."""
+        df = self._query(
+            name="filter_volunteers_by_categories",
+            sql="""
+            SELECT DISTINCT v.given_name || ' ' || v.family_name AS volunteer
+            FROM v1.skill_category c
+                   JOIN v1.skill s ON s.category_id = c.id
+                   JOIN v1.volunteer_skill vs ON vs.skill_id = s.id
+                   JOIN v1.volunteer v ON vs.volunteer_id = v.id
+            WHERE c.name = ANY (CAST(:categories AS text[]));
+            """,
+            params={"categories": sorted(categories)},
+        )
+        return sorted(df["volunteer"].tolist())
+
+    def query_volunteers(self, plan: Plan) -> list[str]:
+        if self._index is not None:
+            self._index.refresh(engine=self._conn.engine)
+            plan = optimise(plan, cardinality=lambda skill: self._index.bitset(skill).bit_count())
+            return self._index.names(evaluate(plan, self._index))
+
+        condition, params = to_sql(plan, skill_ids=self._skill_ids_by_name)
+        df = self._query(
+            name="query_volunteers",
+            sql=f"""
+            SELECT v.given_name || ' ' || v.family_name AS volunteer
+            FROM v1.volunteer_skill_set vss
+                   JOIN v1.volunteer v ON vss.volunteer_id = v.id
+            WHERE {condition};
+            """,
+            params=params,
+        )
+        return sorted(set(df["volunteer"]))
 
     def set_volunteer_skills(self, volunteer_id: str, skill_ids: list[str]) -> None:
+        """
+        Set the skills a volunteer has, waiting until saved.
+
+        Overwrites any changes made since the volunteer's skills were loaded. See `save_volunteer_skills()` to save
+        without waiting, and without overwriting.
+        """
         conn = self._conn.session.connection()
+        with self._metrics.measure("set_volunteer_skills") as measurement:
+            mark_cache_miss()
+            try:
+                measurement.rows = _write_volunteer_skills(conn=conn, volunteer_id=volunteer_id, skill_ids=skill_ids)
+                conn.commit()
+            except DatabaseError as e:
+                conn.rollback()
+                raise RuntimeError("Error updating volunteer skills") from e
+        # so the next read sees a new data version, rather than waiting for the current version to expire
+        data_version.clear()
 
-        try:
-            conn.execute(
-                statement=text("DELETE FROM v1.volunteer_skill WHERE volunteer_id = :volunteer_id;"),
-                parameters={"volunteer_id": volunteer_id},
-            )
+    def save_volunteer_skills(self, volunteer_id: str, skill_ids: list[str], context: VolunteerContext) -> Future:
+        """
+        Queue setting the skills a volunteer has, without waiting until saved.
 
-            values = [{"volunteer_id": int(volunteer_id), "skill_id": int(skill_id)} for skill_id in skill_ids]
-            placeholders, params = encode_insert_params(values=values)
-            statement = f"""
-            INSERT INTO v1.volunteer_skill (volunteer_id, skill_id)
-            VALUES {', '.join(placeholders)};
-            """
-            conn.execute(statement=text(statement), parameters=params)
+        The save is rejected with a `SkillSaveConflictError` if the volunteer's skills have been updated since they
+        were loaded in `context`. The returned future is set once saved (see `skill_save_queue()`).
+        """
+        save = SkillSave(
+            volunteer_id=volunteer_id,
+            skill_ids=tuple(skill_ids),
+            expected_last_updated_at=context.last_updated_at,
+        )
+        return skill_save_queue(_engine=self._conn.engine).submit(save)
+
+    def volunteer_context(self, volunteer_id: str) -> VolunteerContext:
+        """
+        Possible skills (and their categories), with which a volunteer has and which are new since they last updated
+        their skills.
 
-            conn.commit()
-        except DatabaseError as e:
-            conn.rollback()
-            raise RuntimeError("Error updating volunteer skills") from e
+        Loaded in a single query.
+        """
+        df = self._query(
+            name="volunteer_context",
+            sql="""
+            SELECT s.id,
+                   s.name,
+                   c.name AS category,
+                   vs.volunteer_id IS NOT NULL AS selected,
+                   coalesce(s.updated_at > vsu.last_updated_at, FALSE) AS new,
+                   vsu.last_updated_at
+            FROM v1.skill s
+                   LEFT JOIN v1.skill_category c ON s.category_id = c.id
+                   LEFT JOIN v1.volunteer_skill vs ON vs.skill_id = s.id AND vs.volunteer_id = :volunteer_id
+                   LEFT JOIN v1.volunteer_skill_update vsu ON vsu.volunteer_id = :volunteer_id
+            ORDER BY s.name;
+            """,
+            params={"volunteer_id": int(volunteer_id)},
+        )
+        ids = df["id"].astype(str)
+        last_updated_at = df["last_updated_at"].dropna()
+        return VolunteerContext(
+            volunteer_id=volunteer_id,
+            skills=_to_mapping(df, key="id", value="name"),
+            skill_categories=dict(zip(ids.tolist(), df["category"].fillna(UNCATEGORISED).tolist())),
+            selected_skill_ids=frozenset(ids[df["selected"].astype(bool)].tolist()),
+            new_skill_ids=frozenset(ids[df["new"].astype(bool)].tolist()),
+            last_updated_at=last_updated_at.iloc[0] if not last_updated_at.empty else None,
+        )
 
     def volunteer_skills_last_updated(self, volunteer_id: str) -> Timestamp:
-        df = self._conn.query(
+        df = self._query(
+            name="volunteer_skills_last_updated",
             sql="SELECT last_updated_at FROM v1.volunteer_skill_update WHERE volunteer_id = :volunteer_id LIMIT 1;",
             params={"volunteer_id": volunteer_id},
-            ttl=timedelta(minutes=10),
         )
         return df.iloc[0, 0]
 
 
+def _write_volunteer_skills(conn: Connection, volunteer_id: str, skill_ids: list[str] | tuple[str, ...]) -> int:
+    """
+    Set the skills a volunteer has, as a diff against their current skills, without committing.
+
+    Only skills that have been removed or added are deleted or inserted, in a single statement. If nothing has
+    changed, the volunteer's last updated time is still set to record they've reviewed their skills.
+
+    Returns the number of skills the volunteer now has.
+    """
+    statement = text("""
+    WITH removed AS (
+        DELETE FROM v1.volunteer_skill
+        WHERE volunteer_id = :volunteer_id AND skill_id <> ALL (CAST(:skill_ids AS int[]))
+        RETURNING skill_id
+    ),
+    added AS (
+        INSERT INTO v1.volunteer_skill (volunteer_id, skill_id)
+        SELECT :volunteer_id, unnest(CAST(:skill_ids AS int[]))
+        ON CONFLICT DO NOTHING
+        RETURNING skill_id
+    ),
+    reviewed AS (
+        INSERT INTO v1.volunteer_skill_update (volunteer_id)
+        SELECT :volunteer_id
+        WHERE NOT EXISTS (SELECT 1 FROM removed) AND NOT EXISTS (SELECT 1 FROM added)
+        ON CONFLICT (volunteer_id)
+        DO UPDATE SET
+          last_updated_at = now()
+    )
+    SELECT (SELECT count(*) FROM removed) AS removed, (SELECT count(*) FROM added) AS added;
+    """)
+    params = {"volunteer_id": int(volunteer_id), "skill_ids": sorted({int(skill_id) for skill_id in skill_ids})}
+    conn.execute(statement=statement, parameters=params)
+    return len(params["skill_ids"])
+
+
+def _check_volunteer_skills_version(conn: Connection, save: SkillSave) -> None:
+    """
+    Lock a volunteer's last updated time until the end of the transaction and check it's as a save expects.
+
+    Volunteers who have never updated their skills get a placeholder row (overwritten by the save) so there's a row
+    to lock, otherwise two first saves could both pass the check.
+    """
+    current = conn.execute(
+        text("""
+        INSERT INTO v1.volunteer_skill_update AS vsu (volunteer_id, last_updated_at)
+        VALUES (:volunteer_id, '-infinity')
+        ON CONFLICT (volunteer_id)
+        DO UPDATE SET
+          last_updated_at = vsu.last_updated_at
+        RETURNING nullif(vsu.last_updated_at, '-infinity');
+        """),
+        {"volunteer_id": int(save.volunteer_id)},
+    ).scalar()
+    if current != save.expected_last_updated_at:
+        raise SkillSaveConflictError(
+            volunteer_id=save.volunteer_id, expected=save.expected_last_updated_at, current=current
+        )
+
+
+def _write_skill_saves(engine: Engine, metrics: QueryMetrics, saves: list[SkillSave]) -> list[Exception | None]:
+    """
+    Write a batch of skill saves in one transaction, so they share a connection and commit.
+
+    Each save is applied in a savepoint, so a conflicting or failed save is rejected without affecting the others.
+    """
+    errors: list[Exception | None] = []
+    with metrics.measure("save_volunteer_skills") as measurement:
+        mark_cache_miss()
+        with engine.begin() as conn:
+            for save in saves:
+                try:
+                    with conn.begin_nested():
+                        _check_volunteer_skills_version(conn=conn, save=save)
+                        measurement.rows += _write_volunteer_skills(
+                            conn=conn, volunteer_id=save.volunteer_id, skill_ids=save.skill_ids
+                        )
+                    errors.append(None)
+                except SkillSaveConflictError as e:
+                    errors.append(e)
+                except DatabaseError as e:
+                    logger.warning("Failed to save skills for volunteer %s", save.volunteer_id, exc_info=True)
+                    error = RuntimeError("Error updating volunteer skills")
+                    error.__cause__ = e
+                    errors.append(error)
+    # so the next read sees a new data version, rather than waiting for the current version to expire
+    data_version.clear()
+    return errors
+
+
+@st.cache_data(ttl=DATA_VERSION_TTL, show_spinner=False)
+def data_version(_engine: Engine) -> str:
+    """
+    Token that changes when volunteers, skills or volunteer skills change.
+
+    Based on the latest change times recorded for each (which are indexed). Checked at most once per
+    `DATA_VERSION_TTL`, or immediately after a write from this app.
+    """
+    mark_cache_miss()
+    with _engine.connect() as conn:
+        version = conn.execute(
+            text("""
+            SELECT greatest(
+                (SELECT max(updated_at) FROM v1.volunteer),
+                (SELECT max(updated_at) FROM v1.skill),
+                (SELECT max(last_updated_at) FROM v1.volunteer_skill_update)
+            );
+            """)
+        ).scalar()
+    return str(version)
+
+
+@st.cache_data(ttl=QUERY_TTL, max_entries=1000, show_spinner=False)
+def _cached_query(_engine: Engine, sql: str, params: dict | None, version: str) -> DataFrame:
+    # `version` isn't used in the query, but as part of the cache key means results are re-queried when data changes
+    with _engine.connect() as conn:
+        df = read_sql(text(sql), conn, params=params)
+    mark_cache_miss(bytes_fetched=int(df.memory_usage(deep=True).sum()))
+    return df
+
+
+def diagnostics_settings() -> dict:
+    """Diagnostics settings from Streamlit secrets, if set."""
+    return st.secrets.get("diagnostics", {})
+
+
+@st.cache_resource
+def query_metrics() -> QueryMetrics:
+    """Query metrics shared by all sessions."""
+    slow_query_ms = diagnostics_settings().get("slow_query_ms", SLOW_QUERY_THRESHOLD.total_seconds() * 1000)
+    return QueryMetrics(slow_query_threshold=timedelta(milliseconds=slow_query_ms))
+
+
+def db_connection() -> SQLConnection:
+    conn = st.connection("neon", type="sql", **POOL_OPTIONS)
+    query_metrics().instrument(conn.engine)
+    return conn
+
+
+@st.cache_resource
+def skill_save_queue(_engine: Engine) -> SkillSaveQueue:
+    """Background skill save queue shared by all sessions."""
+    metrics = query_metrics()
+    index = skill_index()
+
+    def write(saves: list[SkillSave]) -> list[Exception | None]:
+        errors = _write_skill_saves(engine=_engine, metrics=metrics, saves=saves)
+        # so skill co-occurrences (e.g. suggestions) reflect saves straight away, rather than at the next refresh
+        try:
+            index.refresh(engine=_engine, force=True)
+        except DatabaseError:
+            logger.warning("Failed to refresh skill index after saves", exc_info=True)
+        return errors
+
+    return SkillSaveQueue(writer=write)
+
+
+@st.cache_resource
+def skill_index() -> SkillIndex:
+    """Skill index shared by all sessions."""
+    return SkillIndex()
+
+
+@st.cache_resource(show_spinner="Loading data...")
+def warm_up(_conn: SQLConnection) -> None:
+    """
+    Load shared reference data concurrently, so it's cached before the first page renders.
+
+    Runs once per app instance, rather than on the first use of each query by each page. Running queries in parallel
+    also opens pooled connections. Failures are logged rather than raised, as pages will retry these queries anyway.
+
+    Worker threads are given the calling script's run context, as Streamlit caches expect one.
+    """
+    client = VolunteerSkillsClient(conn=_conn, metrics=query_metrics())
+    engine = _conn.engine
+    tasks = {
+        "possible_skills": lambda: client.possible_skills,
+        "available_skills": lambda: client.available_skills,
+        "skill_categories": lambda: client.skill_categories,
+        "volunteers": lambda: client.volunteers,
+        "stats_snapshot": lambda: client.stats_snapshot,
+        "skill_index": lambda: skill_index().refresh(engine=engine),
+    }
+
+    started = perf_counter()
+    with ThreadPoolExecutor(
+        max_workers=POOL_OPTIONS["pool_size"],
+        thread_name_prefix="warm_up",
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx()),
+    ) as executor:
+        # data version is shared by all queries, so fetched first rather than by each at once
+        try:
+            executor.submit(data_version, _engine=engine).result()
+        except Exception:
+            logger.warning("Failed to warm up data_version", exc_info=True)
+        futures = {executor.submit(task): name for name, task in tasks.items()}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception:
+                logger.warning("Failed to warm up %s", futures[future], exc_info=True)
+    logger.info("Warmed up in %.0f ms", (perf_counter() - started) * 1000)
+
+
+@st.cache_resource(show_spinner=False)
 def app_version() -> str:
-    with Path("pyproject.toml").open(mode="rb") as f:
+    """App version from project metadata, read once per app instance rather than on every run."""
+    with (Path(__file__).parent / "pyproject.toml").open(mode="rb") as f:
         # noinspection PyTypeChecker
         data = toml_load(f)
         return data["project"]["version"]
@@ -0,0 +1,179 @@
+from dataclasses import dataclass
+from itertools import chain
+from typing import Iterable, Self
+
+import numpy as np
+
+# volunteers are added to the matrix product in chunks, to bound the memory used for their pairs of skills
+BUILD_CHUNK_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class SkillAssociation:
+    """
+    How often volunteers with one skill also have another.
+
+    `confidence` is the proportion of volunteers with `skill_id` who also have `other_skill_id`. `lift` is how much
+    more likely that is than for volunteers in general (1 if unrelated).
+    """
+
+    skill_id: int
+    other_skill_id: int
+    volunteers: int
+    confidence: float
+    lift: float
+
+
+class SkillCooccurrence:
+    """
+    Skill by skill co-occurrence counts, i.e. the number of volunteers with both of each pair of skills.
+
+    Counts are held as a dense matrix (skills are far fewer than volunteers), with the number of volunteers with each
+    skill on the diagonal. The matrix is built as a single (sparse) matrix product, XᵀX where X has a row of skills
+    per volunteer, by counting each volunteer's pairs of skills, then updated incrementally as volunteers' skills
+    change, by only the pairs of skills they added or removed.
+
+    Not thread safe, intended to be owned (and guarded) by a `SkillIndex`.
+    """
+
+    def __init__(self: Self) -> None:
+        self._positions: dict[int, int] = {}
+        self._skill_ids: list[int] = []
+        self._counts = np.zeros((0, 0), dtype=np.int64)
+        self._volunteers = 0
+        # incremented whenever counts change, so results derived from all counts can be cached until then
+        self._generation = 0
+        self._associations_key: tuple[int, int, int] | None = None
+        self._associations: list[SkillAssociation] = []
+
+    @property
+    def volunteers(self: Self) -> int:
+        """Number of volunteers with at least one skill."""
+        return self._volunteers
+
+    def _position(self: Self, skill_id: int) -> int:
+        position = self._positions.get(skill_id)
+        if position is None:
+            position = self._positions[skill_id] = len(self._skill_ids)
+            self._skill_ids.append(skill_id)
+        return position
+
+    def _grow(self: Self) -> None:
+        # new skills are rare, so the matrix is resized to fit exactly rather than with spare capacity
+        size = len(self._skill_ids)
+        if size > len(self._counts):
+            counts = np.zeros((size, size), dtype=np.int64)
+            counts[: len(self._counts), : len(self._counts)] = self._counts
+            self._counts = counts
+
+    def build(self: Self, volunteer_skills: Iterable[frozenset[int]]) -> None:
+        """Replace all counts with those for the given skills of each volunteer."""
+        skill_sets = [skill_ids for skill_ids in volunteer_skills if skill_ids]
+        lengths = np.fromiter(map(len, skill_sets), dtype=np.int64, count=len(skill_sets))
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        # skills are mapped to matrix positions for all volunteers at once, rather than per skill of each volunteer
+        flat = np.fromiter(chain.from_iterable(skill_sets), dtype=np.int64, count=int(offsets[-1]))
+        skill_ids, positions = np.unique(flat, return_inverse=True)
+        rows = np.repeat(np.arange(len(skill_sets)), lengths)
+        self._skill_ids = skill_ids.tolist()
+        self._positions = {skill_id: position for position, skill_id in enumerate(self._skill_ids)}
+        size = len(self._skill_ids)
+
+        # as X is sparse (volunteers have few of all skills), only the pairs of skills each volunteer has are counted,
+        # rather than multiplying dense rows, which would scale with the square of all skills per volunteer
+        counts = np.zeros(size * size, dtype=np.int64)
+        for start in range(0, len(skill_sets), BUILD_CHUNK_SIZE):
+            end = min(start + BUILD_CHUNK_SIZE, len(skill_sets))
+            entries = np.arange(offsets[start], offsets[end])
+            # each skill of a volunteer is paired with each of their skills (including itself, for the diagonal)
+            pairs_per_entry = lengths[rows[entries]]
+            pair_entries = np.repeat(entries, pairs_per_entry)
+            pair_starts = np.repeat(np.cumsum(pairs_per_entry) - pairs_per_entry, pairs_per_entry)
+            other_entries = offsets[rows[pair_entries]] + np.arange(len(pair_entries)) - pair_starts
+            counts += np.bincount(positions[pair_entries] * size + positions[other_entries], minlength=size * size)
+        self._counts = counts.reshape(size, size)
+        self._volunteers = len(skill_sets)
+        self._generation += 1
+
+    def update(self: Self, previous: frozenset[int], current: frozenset[int]) -> None:
+        """Update counts for a volunteer whose skills changed from `previous` to `current`."""
+        if previous == current:
+            return
+        previous_ = [self._position(skill_id) for skill_id in previous]
+        current_ = [self._position(skill_id) for skill_id in current]
+        self._grow()
+        self._counts[np.ix_(previous_, previous_)] -= 1
+        self._counts[np.ix_(current_, current_)] += 1
+        self._volunteers += bool(current) - bool(previous)
+        self._generation += 1
+
+    def _lift(self: Self, counts: np.ndarray, totals: np.ndarray, other_totals: np.ndarray) -> np.ndarray:
+        # for only the given counts, rather than all pairs of skills, with totals for each skill broadcast to match
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.nan_to_num(counts * float(self._volunteers) / (totals.astype(np.float64) * other_totals))
+
+    def associations(self: Self, limit: int, min_volunteers: int = 2) -> list[SkillAssociation]:
+        """
+        Most strongly associated pairs of skills (by lift, then number of volunteers), strongest first.
+
+        Each pair is only included once, in the direction with the higher confidence. Pairs held by fewer than
+        `min_volunteers` are excluded, as lift is unreliable for rare pairs.
+
+        Results are cached until counts next change, as they're derived from all pairs of skills.
+        """
+        key = (self._generation, limit, min_volunteers)
+        if self._associations_key == key:
+            return list(self._associations)
+
+        totals = np.diag(self._counts)
+        # upper triangle only, so each pair (and no skill with itself) is considered once
+        first, second = np.nonzero(np.triu(self._counts >= min_volunteers, k=1))
+        counts = self._counts[first, second]
+        lift = self._lift(counts, totals[first], totals[second])
+        order = np.lexsort((-counts, -lift))[:limit]
+
+        associations = []
+        for i, j, pair_lift in zip(first[order].tolist(), second[order].tolist(), lift[order].tolist()):
+            # from the rarer skill, as volunteers with it are more likely to have the other than vice versa
+            if totals[j] < totals[i]:
+                i, j = j, i
+            associations.append(self._association(i, j, lift=pair_lift))
+
+        self._associations_key = key
+        self._associations = associations
+        return list(associations)
+
+    def suggest(self: Self, skill_ids: set[int], limit: int, min_volunteers: int = 2) -> list[SkillAssociation]:
+        """
+        Skills usually held by volunteers with some of the given skills, but not in them, most likely first.
+
+        Each suggestion is for the given skill it's most often held with (highest confidence), and only included if
+        it's held with that skill more often than by volunteers in general (a lift above 1).
+        """
+        held = [self._positions[skill_id] for skill_id in skill_ids if skill_id in self._positions]
+        if not held:
+            return []
+
+        # only the rows for the given skills are needed, against the totals for all skills
+        totals = np.diag(self._counts)
+        counts = self._counts[held]
+        lift = self._lift(counts, totals[held][:, None], totals[None, :])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            confidence = np.where((counts >= min_volunteers) & (lift > 1), counts / totals[held][:, None], 0)
+        confidence[:, held] = 0
+
+        best = confidence.argmax(axis=0)
+        scores = confidence[best, np.arange(len(self._counts))]
+        candidates = np.flatnonzero(scores)
+        top = candidates[np.argsort(-scores[candidates], kind="stable")[:limit]]
+        return [self._association(held[best[j]], j, lift=lift[best[j], j]) for j in top.tolist()]
+
+    def _association(self: Self, i: int, j: int, lift: float) -> SkillAssociation:
+        volunteers = int(self._counts[i, j])
+        return SkillAssociation(
+            skill_id=self._skill_ids[i],
+            other_skill_id=self._skill_ids[j],
+            volunteers=volunteers,
+            confidence=volunteers / int(self._counts[i, i]),
+            lift=float(lift),
+        )
@@ -0,0 +1,280 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from heapq import nsmallest
+from threading import Lock, RLock
+from time import monotonic
+from typing import Iterable, Iterator, Self
+
+from sqlalchemy import Engine, TextClause, text
+
+from skill_cooccurrence import SkillAssociation, SkillCooccurrence
+
+# volunteers whose skills were saved in a transaction still open when the index was last refreshed will have a
+# `last_updated_at` slightly before the watermark, so each refresh re-reads this overlap to catch them
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+
+def iter_bits(bitset: int) -> Iterator[int]:
+    """Yield the position of each set bit in a bitset, lowest first."""
+    # searches the binary representation (lowest bit first), as repeatedly clearing the lowest bit of a large int
+    # is quadratic in the number of set bits
+    bits = bin(bitset)[:1:-1]
+    position = bits.find("1")
+    while position != -1:
+        yield position
+        position = bits.find("1", position + 1)
+
+
+def _to_bitset(positions: Iterable[int]) -> int:
+    """Bitset with the given bits set, built in a single pass (via a byte array) rather than a bit at a time."""
+    positions = list(positions)
+    if not positions:
+        return 0
+    data = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, "little")
+
+
+@dataclass(frozen=True)
+class RankedVolunteer:
+    """A volunteer scored by the (weighted) number of requested skills they have."""
+
+    name: str
+    score: float
+    matched: tuple[str, ...]
+    missing: tuple[str, ...]
+
+
+class SkillIndex:
+    """
+    In-memory index of volunteers by skill.
+
+    Each skill maps to a bitset (a Python int) where bit N is set if the volunteer with ID N has that skill. Queries
+    for volunteers with all of a set of skills are answered by intersecting bitsets rather than querying the database.
+
+    The index is built from `v1.volunteer_skill` and refreshed incrementally using the last updated times in
+    `v1.volunteer_skill_update`. Refreshes are rate limited to at most one per `refresh_interval`.
+
+    Skill co-occurrence counts (see `SkillCooccurrence`) are maintained alongside, for associations between skills.
+
+    Instances are intended to be shared between Streamlit sessions (threads) and are guarded by a lock.
+    """
+
+    def __init__(self: Self, refresh_interval: timedelta = timedelta(seconds=30)) -> None:
+        self._lock = RLock()
+        self._refresh_lock = Lock()
+        self._refresh_interval = refresh_interval.total_seconds()
+        self._checked_at: float | None = None
+        self._watermark: datetime | None = None
+
+        self._skill_ids: dict[str, int] = {}
+        self._skill_names: dict[int, str] = {}
+        self._bitsets: dict[int, int] = {}
+        self._universe = 0
+        self._volunteer_names: dict[int, str] = {}
+        self._volunteer_skills: dict[int, frozenset[int]] = {}
+        self._cooccurrence = SkillCooccurrence()
+
+    @property
+    def skill_names(self: Self) -> dict[int, str]:
+        """Skill names indexed by skill ID."""
+        with self._lock:
+            return dict(self._skill_names)
+
+    @property
+    def volunteer_names(self: Self) -> dict[int, str]:
+        """Names of volunteers with at least one skill, indexed by volunteer ID."""
+        with self._lock:
+            return dict(self._volunteer_names)
+
+    @property
+    def universe(self: Self) -> int:
+        """Bitset of all volunteers with at least one skill."""
+        with self._lock:
+            return self._universe
+
+    def bitset(self: Self, skill: str) -> int:
+        """Bitset of volunteers with a skill, by skill name. Unknown skills are treated as held by no-one."""
+        with self._lock:
+            skill_id = self._skill_ids.get(skill)
+            if skill_id is None:
+                return 0
+            return self._bitsets.get(skill_id, 0)
+
+    def names(self: Self, bitset: int) -> list[str]:
+        """Sorted, distinct, names of volunteers in a bitset."""
+        with self._lock:
+            return sorted({self._volunteer_names[volunteer_id] for volunteer_id in iter_bits(bitset)})
+
+    def filter(self: Self, skills: set[str]) -> list[str]:
+        """Names of volunteers with all the given skills (by name)."""
+        if not skills:
+            return []
+
+        # intersect smallest first so empty results are found as early as possible
+        with self._lock:
+            bitsets = sorted((self.bitset(skill) for skill in skills), key=int.bit_count)
+            result = bitsets[0]
+            for bitset in bitsets[1:]:
+                if not result:
+                    break
+                result &= bitset
+            return self.names(result)
+
+    def rank(self: Self, weights: dict[str, float], limit: int) -> list[RankedVolunteer]:
+        """
+        Volunteers with any of the given skills (by name), best matches first.
+
+        Volunteers are scored by the total weight of the given skills they have. Only volunteers with at least one
+        skill are scored (found from the union of the skill bitsets), and the top `limit` kept.
+        """
+        with self._lock:
+            skill_names = {self._skill_ids[skill]: skill for skill in weights if skill in self._skill_ids}
+            candidates = 0
+            for skill_id in skill_names:
+                candidates |= self._bitsets.get(skill_id, 0)
+
+            ranked = []
+            for volunteer_id in iter_bits(candidates):
+                skill_ids = skill_names.keys() & self._volunteer_skills[volunteer_id]
+                matched = {skill_names[skill_id] for skill_id in skill_ids}
+                ranked.append((sum(weights[skill] for skill in matched), self._volunteer_names[volunteer_id], matched))
+
+        best = nsmallest(limit, ranked, key=lambda item: (-item[0], item[1]))
+        return [
+            RankedVolunteer(
+                name=name,
+                score=score,
+                matched=tuple(sorted(matched)),
+                missing=tuple(sorted(weights.keys() - matched)),
+            )
+            for score, name, matched in best
+        ]
+
+    def associations(self: Self, limit: int, min_volunteers: int = 2) -> list[SkillAssociation]:
+        """Most strongly associated pairs of skills, strongest first (see `SkillCooccurrence.associations()`)."""
+        with self._lock:
+            return self._cooccurrence.associations(limit=limit, min_volunteers=min_volunteers)
+
+    def suggest(self: Self, skill_ids: set[int], limit: int, min_volunteers: int = 2) -> list[SkillAssociation]:
+        """Skills usually held with the given skills (by ID), most likely first (see `SkillCooccurrence.suggest()`)."""
+        with self._lock:
+            return self._cooccurrence.suggest(skill_ids=skill_ids, limit=limit, min_volunteers=min_volunteers)
+
+    def refresh(self: Self, engine: Engine, force: bool = False) -> None:
+        """
+        Bring index up to date with the database.
+
+        The first refresh loads all volunteer skills, later refreshes only reload volunteers (and skills) changed
+        since the previous refresh (plus an overlap). Unless forced, does nothing if called within the refresh interval.
+        """
+        # readers are only blocked while changes are applied, not while they're fetched, and only one thread needs to
+        # refresh at a time (unless the index is empty, in which case callers must wait for the initial build)
+        if not self._refresh_lock.acquire(blocking=self._watermark is None):
+            return
+        try:
+            now = monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self._refresh_interval:
+                return
+
+            since = None if self._watermark is None else self._watermark - REFRESH_OVERLAP
+            with engine.connect() as conn:
+                watermark = conn.execute(text("SELECT now();")).scalar()
+                skills = conn.execute(
+                    text("SELECT id, name FROM v1.skill WHERE :since IS NULL OR updated_at > :since;"),
+                    {"since": since},
+                ).all()
+                rows = conn.execute(self._volunteer_skills_statement(since), {"since": since}).all()
+
+            with self._lock:
+                self._apply_skills(skills)
+                self._apply_volunteer_skills(rows, full=since is None)
+                self._watermark = watermark
+                self._checked_at = now
+        finally:
+            self._refresh_lock.release()
+
+    @staticmethod
+    def _volunteer_skills_statement(since: datetime | None) -> TextClause:
+        if since is None:
+            return text("""
+            SELECT v.id AS volunteer_id, v.given_name || ' ' || v.family_name AS volunteer, vs.skill_id
+            FROM v1.volunteer_skill vs
+                   JOIN v1.volunteer v ON vs.volunteer_id = v.id;
+            """)
+
+        # left join so volunteers who removed all their skills are returned (with a null skill)
+        return text("""
+        WITH changed AS (
+            SELECT volunteer_id AS id FROM v1.volunteer_skill_update WHERE last_updated_at > :since
+            UNION
+            SELECT id FROM v1.volunteer WHERE updated_at > :since
+        )
+        SELECT v.id AS volunteer_id, v.given_name || ' ' || v.family_name AS volunteer, vs.skill_id
+        FROM changed c
+               JOIN v1.volunteer v ON c.id = v.id
+               LEFT JOIN v1.volunteer_skill vs ON vs.volunteer_id = v.id;
+        """)
+
+    def _apply_skills(self: Self, rows: list) -> None:
+        for skill_id, name in rows:
+            previous = self._skill_names.get(skill_id)
+            if previous is not None:
+                del self._skill_ids[previous]
+            self._skill_names[skill_id] = name
+            self._skill_ids[name] = skill_id
+
+    def _apply_volunteer_skills(self: Self, rows: list, full: bool) -> None:
+        names: dict[int, str] = {}
+        skills: dict[int, set[int]] = {}
+        for volunteer_id, name, skill_id in rows:
+            names[volunteer_id] = name
+            skills.setdefault(volunteer_id, set())
+            if skill_id is not None:
+                skills[volunteer_id].add(skill_id)
+
+        if full:
+            self._build(names=names, skills=skills)
+            return
+
+        for volunteer_id, skill_ids in skills.items():
+            self._set_volunteer(volunteer_id=volunteer_id, name=names[volunteer_id], skill_ids=frozenset(skill_ids))
+
+    def _build(self: Self, names: dict[int, str], skills: dict[int, set[int]]) -> None:
+        """
+        Replace the index with the given volunteers and their skills.
+
+        Each bitset is built once from the volunteers with that skill, as setting bits one volunteer at a time copies
+        the whole (immutable) int each time, which is quadratic in the number of volunteers.
+        """
+        self._volunteer_skills = {volunteer_id: frozenset(ids) for volunteer_id, ids in skills.items() if ids}
+        self._volunteer_names = {volunteer_id: names[volunteer_id] for volunteer_id in self._volunteer_skills}
+
+        volunteer_ids: dict[int, list[int]] = {}
+        for volunteer_id, skill_ids in self._volunteer_skills.items():
+            for skill_id in skill_ids:
+                volunteer_ids.setdefault(skill_id, []).append(volunteer_id)
+        self._bitsets = {skill_id: _to_bitset(ids) for skill_id, ids in volunteer_ids.items()}
+        self._universe = _to_bitset(self._volunteer_skills)
+        # rebuilt in one go rather than updated per volunteer, as for bitsets
+        self._cooccurrence.build(self._volunteer_skills.values())
+
+    def _set_volunteer(self: Self, volunteer_id: int, name: str, skill_ids: frozenset[int]) -> None:
+        bit = 1 << volunteer_id
+        previous = self._volunteer_skills.get(volunteer_id, frozenset())
+        self._cooccurrence.update(previous=previous, current=skill_ids)
+
+        for skill_id in previous - skill_ids:
+            self._bitsets[skill_id] &= ~bit
+        for skill_id in skill_ids - previous:
+            self._bitsets[skill_id] = self._bitsets.get(skill_id, 0) | bit
+
+        if skill_ids:
+            self._volunteer_names[volunteer_id] = name
+            self._volunteer_skills[volunteer_id] = skill_ids
+            self._universe |= bit
+        else:
+            self._volunteer_names.pop(volunteer_id, None)
+            self._volunteer_skills.pop(volunteer_id, None)
+            self._universe &= ~bit
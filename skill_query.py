@@ -0,0 +1,258 @@
+from dataclasses import dataclass
+from math import inf
+from typing import Callable
+
+from skill_index import SkillIndex
+
+SKILL_FIELD = "skill"
+
+
+class SkillQueryError(ValueError):
+    """Raised when a condition tree can't be converted into a skill query."""
+
+    pass
+
+
+@dataclass(frozen=True)
+class Skill:
+    """Volunteers with a skill."""
+
+    name: str
+
+
+@dataclass(frozen=True)
+class And:
+    """Volunteers matching all terms."""
+
+    terms: tuple
+
+
+@dataclass(frozen=True)
+class Or:
+    """Volunteers matching any term."""
+
+    terms: tuple
+
+
+@dataclass(frozen=True)
+class Not:
+    """Volunteers not matching a term."""
+
+    term: object
+
+
+@dataclass(frozen=True)
+class Nothing:
+    """No volunteers (e.g. a skill no-one has)."""
+
+    pass
+
+
+Plan = Skill | And | Or | Not | Nothing
+
+
+def _parse_skills(value: object) -> list[str]:
+    values = value if isinstance(value, list) else [value]
+    if not values or not all(isinstance(v, str) for v in values):
+        raise SkillQueryError(f"Unsupported skill value: {value!r}")
+    return values
+
+
+def _parse_rule(operator: str, args: object) -> Plan:
+    # rule operands may be in either order depending on the operator (e.g. 'in' for select vs. multiselect fields)
+    if not isinstance(args, list) or len(args) != 2 or {"var": SKILL_FIELD} not in args:
+        raise SkillQueryError(f"Unsupported rule: {operator} {args!r}")
+    value = args[1] if args[0] == {"var": SKILL_FIELD} else args[0]
+    skills = _parse_skills(value)
+    if operator in ("==", "!=") and len(skills) != 1:
+        raise SkillQueryError(f"Unsupported rule, expected a single skill: {operator} {args!r}")
+
+    if operator == "==":
+        return Skill(name=skills[0])
+    if operator == "!=":
+        return Not(term=Skill(name=skills[0]))
+    if operator == "in":
+        return Or(terms=tuple(Skill(name=skill) for skill in skills))
+    raise SkillQueryError(f"Unsupported operator: {operator}")
+
+
+def parse_json_logic(logic: dict | str | None) -> Plan | None:
+    """
+    Convert JSON Logic (as returned by `streamlit_condition_tree` with `return_type="jsonLogic"`) into a query plan.
+
+    Supports and/or/not groups (nested to any depth) over rules for the skill field using equals, not equals, any in
+    and not any in operators. Returns None for an empty tree.
+    """
+    if not logic:
+        return None
+    if not isinstance(logic, dict) or len(logic) != 1:
+        raise SkillQueryError(f"Unsupported expression: {logic!r}")
+
+    operator, args = next(iter(logic.items()))
+    if operator in ("and", "or"):
+        if not isinstance(args, list):
+            raise SkillQueryError(f"Unsupported expression: {logic!r}")
+        terms = tuple(term for term in (parse_json_logic(arg) for arg in args) if term is not None)
+        if not terms:
+            return None
+        return And(terms=terms) if operator == "and" else Or(terms=terms)
+    if operator in ("!", "!!"):
+        # unary operators take a single argument, optionally wrapped in a list
+        if isinstance(args, list) and len(args) != 1:
+            raise SkillQueryError(f"Unsupported expression: {logic!r}")
+        term = parse_json_logic(args[0] if isinstance(args, list) else args)
+        if operator == "!!":
+            return term
+        return None if term is None else Not(term=term)
+    return _parse_rule(operator=operator, args=args)
+
+
+def describe(plan: Plan) -> str:
+    """Human readable version of a query plan, e.g. 'GIS AND (Python OR R) AND NOT trainee'."""
+    if isinstance(plan, Skill):
+        return plan.name
+    if isinstance(plan, Nothing):
+        return "(nothing)"
+    if isinstance(plan, Not):
+        return f"NOT {_describe_term(plan.term)}"
+    conjunction = " AND " if isinstance(plan, And) else " OR "
+    return conjunction.join(_describe_term(term) for term in plan.terms)
+
+
+def _describe_term(plan: Plan) -> str:
+    return f"({describe(plan)})" if isinstance(plan, (And, Or)) else describe(plan)
+
+
+def _flatten(plan: Plan) -> Plan:
+    """Merge nested groups of the same type, remove duplicate terms and double negations."""
+    if isinstance(plan, Not):
+        term = _flatten(plan.term)
+        return term.term if isinstance(term, Not) else Not(term=term)
+    if not isinstance(plan, (And, Or)):
+        return plan
+
+    terms = []
+    for term in (_flatten(term) for term in plan.terms):
+        nested = term.terms if isinstance(term, type(plan)) else (term,)
+        terms.extend(t for t in nested if t not in terms)
+    return terms[0] if len(terms) == 1 else type(plan)(terms=tuple(terms))
+
+
+def _fold(plan: Plan, estimate: Callable[[Plan], float]) -> Plan:
+    """Replace terms known to match no volunteers with `Nothing` and propagate."""
+    if isinstance(plan, Skill):
+        return Nothing() if estimate(plan) == 0 else plan
+    if isinstance(plan, Not):
+        return Not(term=_fold(plan.term, estimate))
+    if isinstance(plan, Nothing):
+        return plan
+
+    terms = [_fold(term, estimate) for term in plan.terms]
+    if isinstance(plan, And):
+        if any(isinstance(term, Nothing) for term in terms):
+            return Nothing()
+        # 'NOT nothing' is everything, which doesn't affect an intersection
+        terms = [term for term in terms if not (isinstance(term, Not) and isinstance(term.term, Nothing))]
+        if not terms:
+            return Not(term=Nothing())
+    else:
+        terms = [term for term in terms if not isinstance(term, Nothing)]
+        if not terms:
+            return Nothing()
+    return terms[0] if len(terms) == 1 else type(plan)(terms=tuple(terms))
+
+
+def optimise(plan: Plan, cardinality: Callable[[str], int] | None = None) -> Plan:
+    """
+    Simplify a query plan and order its terms for evaluation.
+
+    Nested groups are flattened and duplicate terms removed. If skill cardinalities (number of volunteers with a skill)
+    are available, terms no-one matches are folded away and intersections are ordered smallest first so they can
+    short-circuit when empty. Negated terms are always applied last within an intersection (as differences).
+    """
+    plan = _flatten(plan)
+    if cardinality is None:
+        return plan
+
+    def estimate(term: Plan) -> float:
+        if isinstance(term, Skill):
+            return cardinality(term.name)
+        if isinstance(term, Nothing):
+            return 0
+        if isinstance(term, And):
+            return min((estimate(t) for t in term.terms if not isinstance(t, Not)), default=inf)
+        if isinstance(term, Or):
+            return sum(estimate(t) for t in term.terms)
+        return inf
+
+    def order(term: Plan) -> Plan:
+        if isinstance(term, Not):
+            return Not(term=order(term.term))
+        if not isinstance(term, (And, Or)):
+            return term
+        terms = [order(t) for t in term.terms]
+        if isinstance(term, And):
+            terms.sort(key=lambda t: (isinstance(t, Not), estimate(t)))
+        return type(term)(terms=tuple(terms))
+
+    return order(_fold(plan, estimate))
+
+
+def evaluate(plan: Plan, index: SkillIndex) -> int:
+    """Evaluate a query plan against a skill index, returning a bitset of matching volunteers."""
+    if isinstance(plan, Skill):
+        return index.bitset(plan.name)
+    if isinstance(plan, Nothing):
+        return 0
+    if isinstance(plan, Not):
+        return index.universe & ~evaluate(plan.term, index)
+    if isinstance(plan, Or):
+        result = 0
+        for term in plan.terms:
+            result |= evaluate(term, index)
+        return result
+
+    result = None
+    for term in plan.terms:
+        if result == 0:
+            break
+        if isinstance(term, Not) and result is not None:
+            result &= ~evaluate(term.term, index)
+            continue
+        bitset = evaluate(term, index)
+        result = bitset if result is None else result & bitset
+    return result
+
+
+def to_sql(plan: Plan, skill_ids: dict[str, int], column: str = "skill_ids") -> tuple[str, dict]:
+    """
+    Compile a query plan into a parameterised SQL condition over an array of skill IDs.
+
+    Skills within an intersection are combined into a single containment test (`@>`) and skills within a union into
+    a single overlap test (`&&`), so each group is one (GIN indexable) array operator. Skill IDs are always passed as
+    bind parameters. Skills not in `skill_ids` (by name) are treated as held by no-one.
+    """
+    plan = _fold(_flatten(plan), estimate=lambda term: int(term.name in skill_ids))
+    params: dict = {}
+
+    def param(skills: list[str]) -> str:
+        name = f"skill_ids_{len(params)}"
+        params[name] = [skill_ids[skill] for skill in skills]
+        return f"CAST(:{name} AS int[])"
+
+    def compile_(term: Plan) -> str:
+        if isinstance(term, Skill):
+            return f"{column} @> {param([term.name])}"
+        if isinstance(term, Nothing):
+            return "FALSE"
+        if isinstance(term, Not):
+            return f"NOT ({compile_(term.term)})"
+
+        skills = [t.name for t in term.terms if isinstance(t, Skill)]
+        others = [compile_(t) for t in term.terms if not isinstance(t, Skill)]
+        operator = "@>" if isinstance(term, And) else "&&"
+        conditions = [f"{column} {operator} {param(skills)}"] if skills else []
+        conditions.extend(f"({condition})" for condition in others)
+        return (" AND " if isinstance(term, And) else " OR ").join(conditions)
+
+    return compile_(plan), params
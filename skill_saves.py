@@ -0,0 +1,114 @@
+import logging
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from queue import Empty, SimpleQueue
+from threading import Lock, Thread
+from time import monotonic
+from typing import Callable, Self
+
+BATCH_WINDOW = timedelta(milliseconds=200)
+MAX_BATCH_SIZE = 50
+
+logger = logging.getLogger(__name__)
+
+
+class SkillSaveConflictError(RuntimeError):
+    """A volunteer's skills were changed (e.g. in another tab) since they were loaded for a save."""
+
+    def __init__(self: Self, volunteer_id: str, expected: datetime | None, current: datetime | None) -> None:
+        super().__init__(f"Skills for volunteer {volunteer_id} changed at {current}, after {expected}")
+        self.volunteer_id = volunteer_id
+        self.expected = expected
+        self.current = current
+
+
+@dataclass(frozen=True)
+class SkillSave:
+    """
+    Skills to set for a volunteer.
+
+    Only applied if the volunteer's skills were last updated at `expected_last_updated_at` (None if never updated).
+    """
+
+    volunteer_id: str
+    skill_ids: tuple[str, ...]
+    expected_last_updated_at: datetime | None
+
+
+# writes a batch of saves, returning an error (or None if applied) for each save, in order
+BatchWriter = Callable[[list[SkillSave]], list[Exception | None]]
+
+
+class SkillSaveQueue:
+    """
+    Background writer for volunteer skill saves.
+
+    Saves are submitted without waiting for them to be written and a future is returned for each. A single worker
+    thread writes saves in batches: saves submitted within `batch_window` of each other (up to `max_batch_size`) are
+    passed to the writer together, so they can share a transaction and commit.
+
+    Instances are intended to be shared between Streamlit sessions (threads). The worker is started on first use and
+    is a daemon thread, so saves still queued when the app exits are lost (as an unsent form would be).
+    """
+
+    def __init__(
+        self: Self, writer: BatchWriter, batch_window: timedelta = BATCH_WINDOW, max_batch_size: int = MAX_BATCH_SIZE
+    ) -> None:
+        self._writer = writer
+        self._batch_window = batch_window.total_seconds()
+        self._max_batch_size = max_batch_size
+        self._queue: SimpleQueue[tuple[SkillSave, Future]] = SimpleQueue()
+        self._lock = Lock()
+        self._worker: Thread | None = None
+
+    def submit(self: Self, save: SkillSave) -> Future:
+        """Queue a save, returning a future set to None once written, or to the error if it couldn't be."""
+        future: Future = Future()
+        self._queue.put((save, future))
+        with self._lock:
+            if self._worker is None:
+                self._worker = Thread(target=self._run, name="skill_saves", daemon=True)
+                self._worker.start()
+        return future
+
+    def _next_batch(self: Self) -> list[tuple[SkillSave, Future]]:
+        batch = [self._queue.get()]
+        deadline = monotonic() + self._batch_window
+        while len(batch) < self._max_batch_size:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self: Self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            except Exception as e:
+                # the worker must outlive any one batch, or later saves would never be written or resolved
+                logger.exception("Failed to resolve %d skill saves", len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _write(self: Self, batch: list[tuple[SkillSave, Future]]) -> None:
+        saves = [save for save, _ in batch]
+        try:
+            errors = self._writer(saves)
+        except Exception as e:
+            logger.warning("Failed to write %d skill saves", len(saves), exc_info=True)
+            errors = [e] * len(saves)
+        if len(errors) != len(saves):
+            raise RuntimeError(f"Writer returned {len(errors)} results for {len(saves)} skill saves")
+
+        for (_, future), error in zip(batch, errors):
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
@@ -0,0 +1,78 @@
+import unittest
+from datetime import UTC, datetime
+
+import pyarrow.parquet as pq
+from sqlalchemy import Engine, create_engine, event, text
+from sqlalchemy.pool import StaticPool
+
+from data_export import DELTA_SCHEMA, _write, iter_delta_batches
+
+
+def _make_engine() -> Engine:
+    # SQLite stand in for the tables used by delta exports (with the 'v1' schema as an attached database)
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def _attach(dbapi_conn, _) -> None:
+        dbapi_conn.execute("ATTACH DATABASE ':memory:' AS v1;")
+
+    with engine.begin() as conn:
+        for statement in [
+            "CREATE TABLE v1.volunteer (id INT PRIMARY KEY, given_name TEXT, family_name TEXT, updated_at TEXT);",
+            "CREATE TABLE v1.skill (id INT PRIMARY KEY, name TEXT, description TEXT, updated_at TEXT);",
+            "CREATE TABLE v1.volunteer_skill (volunteer_id INT, skill_id INT, PRIMARY KEY (volunteer_id, skill_id));",
+            "CREATE TABLE v1.volunteer_skill_update (volunteer_id INT PRIMARY KEY, last_updated_at TEXT);",
+            "CREATE TABLE v1.volunteer_skill_tombstone (volunteer_id INT, skill_id INT, deleted_at TEXT);",
+            """
+            CREATE VIEW v1.volunteer_skills_export AS
+            SELECT vs.volunteer_id, v.given_name || ' ' || v.family_name AS volunteer_name,
+                   v.updated_at AS volunteer_updated_at, vs.skill_id, s.name AS skill_name,
+                   s.description AS skill_description, s.updated_at AS skill_updated_at,
+                   vsu.last_updated_at AS volunteer_skills_last_updated_at
+            FROM volunteer_skill vs
+                   JOIN volunteer v ON vs.volunteer_id = v.id
+                   JOIN volunteer_skill_update vsu ON vs.volunteer_id = vsu.volunteer_id
+                   JOIN skill s ON vs.skill_id = s.id;
+            """,
+            "INSERT INTO v1.volunteer_skill_tombstone VALUES (1, 2, '2024-06-01 00:00:00+00:00');",
+            "INSERT INTO v1.volunteer_skill_tombstone VALUES (1, 3, '2023-06-01 00:00:00+00:00');",
+        ]:
+            conn.execute(text(statement))
+    return engine
+
+
+class DeltaExportTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = _make_engine()
+        # compared as text, as SQLite stores times
+        self.since = "2024-01-01 00:00:00+00:00"
+        self.query_ts = datetime(2024, 7, 1, tzinfo=UTC)
+
+    def _export(self, fmt: str) -> bytes:
+        with self.engine.connect() as conn:
+            batches = iter_delta_batches(conn=conn, since=self.since)
+            with _write(batches=batches, fmt=fmt, schema=DELTA_SCHEMA, query_ts=self.query_ts) as file:
+                return file.read()
+
+    def test_tombstones_as_deleted_rows_parquet(self) -> None:
+        with self.engine.connect() as conn:
+            batches = iter_delta_batches(conn=conn, since=self.since)
+            with _write(batches=batches, fmt="parquet", schema=DELTA_SCHEMA, query_ts=self.query_ts) as file:
+                rows = pq.read_table(file).to_pylist()
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["volunteer_id"], 1)
+        self.assertEqual(rows[0]["skill_id"], 2)
+        self.assertIsNone(rows[0]["volunteer_skills_last_updated_at"])
+        self.assertEqual(rows[0]["query_ts"], self.query_ts)
+        self.assertEqual(rows[0]["change"], "deleted")
+
+    def test_tombstones_as_deleted_rows_csv(self) -> None:
+        lines = self._export(fmt="csv").decode().splitlines()
+
+        self.assertEqual(lines[0], ",".join(["", *DELTA_SCHEMA.names]))
+        self.assertEqual(lines[1:], ["0,1,,,2,,,,,2024-07-01T00:00:00+00:00,deleted"])
+
+
+if __name__ == "__main__":
+    unittest.main()
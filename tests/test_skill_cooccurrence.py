@@ -0,0 +1,57 @@
+import random
+import unittest
+
+from skill_cooccurrence import SkillCooccurrence
+
+
+class SkillCooccurrenceTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = random.Random(1)
+        self.volunteers = [frozenset(rng.sample(range(1, 30), k=rng.randint(0, 6))) for _ in range(300)]
+        self.cooccurrence = SkillCooccurrence()
+        self.cooccurrence.build(self.volunteers)
+
+    def _count(self, skill_id: int, other_skill_id: int) -> int:
+        return sum(1 for skill_ids in self.volunteers if {skill_id, other_skill_id} <= skill_ids)
+
+    def _assert_counts(self) -> None:
+        self.assertEqual(self.cooccurrence.volunteers, sum(1 for skill_ids in self.volunteers if skill_ids))
+        for association in self.cooccurrence.associations(limit=1000, min_volunteers=1):
+            self.assertEqual(association.volunteers, self._count(association.skill_id, association.other_skill_id))
+            self.assertAlmostEqual(
+                association.confidence, association.volunteers / self._count(association.skill_id, association.skill_id)
+            )
+
+    def test_build(self) -> None:
+        self._assert_counts()
+
+    def test_update(self) -> None:
+        # cached before counts change, so checks cached associations are replaced
+        self.cooccurrence.associations(limit=1000, min_volunteers=1)
+        for i, skill_ids in enumerate([frozenset({1, 2, 30}), frozenset(), frozenset({5})]):
+            self.cooccurrence.update(previous=self.volunteers[i], current=skill_ids)
+            self.volunteers[i] = skill_ids
+
+        self._assert_counts()
+
+    def test_suggest(self) -> None:
+        held = {1, 2}
+        suggestions = self.cooccurrence.suggest(skill_ids=held, limit=5)
+
+        self.assertLessEqual(len(suggestions), 5)
+        for suggestion in suggestions:
+            self.assertIn(suggestion.skill_id, held)
+            self.assertNotIn(suggestion.other_skill_id, held)
+            self.assertGreater(suggestion.lift, 1)
+        self.assertEqual([s.confidence for s in suggestions], sorted((s.confidence for s in suggestions), reverse=True))
+
+    def test_empty(self) -> None:
+        cooccurrence = SkillCooccurrence()
+        cooccurrence.build([])
+
+        self.assertEqual(cooccurrence.associations(limit=5), [])
+        self.assertEqual(cooccurrence.suggest(skill_ids={1}, limit=5), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
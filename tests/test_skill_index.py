@@ -0,0 +1,54 @@
+import random
+import unittest
+
+from skill_index import SkillIndex, iter_bits
+
+
+class SkillIndexTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = random.Random(1)
+        self.skills = {skill_id: f"skill {skill_id}" for skill_id in range(1, 21)}
+        self.volunteers = {
+            volunteer_id: set(rng.sample(list(self.skills), k=rng.randint(0, 5))) for volunteer_id in range(1, 500)
+        }
+        self.index = SkillIndex()
+        self.index._apply_skills(list(self.skills.items()))
+        self.index._apply_volunteer_skills(self._rows(self.volunteers), full=True)
+
+    @staticmethod
+    def _rows(volunteers: dict[int, set[int]]) -> list[tuple[int, str, int | None]]:
+        return [
+            (volunteer_id, f"volunteer {volunteer_id}", skill_id)
+            for volunteer_id, skill_ids in volunteers.items()
+            for skill_id in skill_ids or [None]
+        ]
+
+    def _assert_matches(self) -> None:
+        for skill_id, name in self.skills.items():
+            expected = {volunteer_id for volunteer_id, skill_ids in self.volunteers.items() if skill_id in skill_ids}
+            self.assertEqual(set(iter_bits(self.index.bitset(name))), expected)
+        expected = {volunteer_id for volunteer_id, skill_ids in self.volunteers.items() if skill_ids}
+        self.assertEqual(set(iter_bits(self.index.universe)), expected)
+
+    def test_build(self) -> None:
+        self._assert_matches()
+
+    def test_incremental(self) -> None:
+        changed = {volunteer_id: set() for volunteer_id in range(1, 50)}
+        changed.update({volunteer_id: {1, 2, 3} for volunteer_id in range(50, 100)})
+        changed[1000] = {4}
+        self.volunteers.update(changed)
+        self.index._apply_volunteer_skills(self._rows(changed), full=False)
+
+        self._assert_matches()
+
+
+class IterBitsTestCase(unittest.TestCase):
+    def test_iter_bits(self) -> None:
+        self.assertEqual(list(iter_bits(0)), [])
+        self.assertEqual(list(iter_bits(0b101001)), [0, 3, 5])
+        self.assertEqual(list(iter_bits(1 << 100_000)), [100_000])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from skill_query import And, Skill, SkillQueryError, parse_json_logic
+
+
+class ParseJsonLogicTestCase(unittest.TestCase):
+    def test_rule(self) -> None:
+        plan = parse_json_logic({"and": [{"==": [{"var": "skill"}, "Python"]}]})
+
+        self.assertEqual(plan, And(terms=(Skill(name="Python"),)))
+
+    def test_invalid_args(self) -> None:
+        for logic in [
+            {"and": 5},
+            {"or": "x"},
+            {"==": 5},
+            {"in": {"var": "skill"}},
+            {"!": 5},
+            {"!": []},
+            {"!": [{"==": [{"var": "skill"}, "Python"]}, {"==": [{"var": "skill"}, "SQL"]}]},
+            {"==": [{"var": "skill"}, ["Python", "SQL"]]},
+            {"!=": [{"var": "skill"}, ["Python", "SQL"]]},
+        ]:
+            with self.subTest(logic=logic), self.assertRaises(SkillQueryError):
+                parse_json_logic(logic)
+
+
+if __name__ == "__main__":
+    unittest.main()